@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of the file keeper and the project loader.
+
+    python benchmark.py watch [-n COUNT ...] [-t SECONDS]
+    python benchmark.py load [-n COUNT] [-r REPEAT] [--cold]
+    python benchmark.py cache [-n COUNT] [-r REPEAT]
+    python benchmark.py yaml [-n COUNT] [-p PROJECTS] [-s SEED]
+    python benchmark.py compress [-n COUNT] [--size SIZE] [-r REPEAT] [-s SEED]
+
+The "watch" benchmark reports the CPU usage of an idle file keeper,
+compared with stat polling every 1 ms.
+The "load" benchmark reports the time of loading a synthetic project,
+compared with reading its files by one worker.
+The "cache" benchmark reports the time of opening a synthetic project
+without the cache file, when the cache file is missing (cold),
+and when the cache file is up to date (warm).
+The "yaml" benchmark saves random projects by the C and the pure Python
+YAML dumpers, then reports their time, and checks the files are identical.
+The "compress" benchmark reports the file size and the time of saving,
+opening and reading a random project with each compression method.
+The modules of editor are imported after the arguments are parsed.
+"""
+
+from typing import List, Tuple, Sequence, Optional, Any
+import sys
+import argparse
+from random import Random
+from os import stat, sync, cpu_count, devnull, remove
+from os.path import join, isfile, getsize
+from functools import partial
+from contextlib import redirect_stdout
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+from time import perf_counter, process_time, sleep
+
+_MARKDOWN = "\n\n".join(f"# Title {i}\n\n" + "Markdown text. " * 40 for i in range(20)) + "\n"
+_PYTHON = "\n".join(f"def function_{i}():\n    return {i}\n" for i in range(200))
+_WORDS = (
+    "the of and to in is that for it as with was on be by this are from at or "
+    "node project file data text editor tree save load open parse block index "
+    "function class return value list dict string number line word code macro"
+).split()
+# The characters that need quoting or escaping in YAML.
+_YAML_CHARS = "abc XYZ 019 :#-|>'\"{}[],&*!%@`\t\\ \xe9\u4e2d\U0001f600 \x85\ufeff\x7f\x1b"
+
+
+def _make_files(path: str, count: int) -> List[str]:
+    """Write the files and return their names."""
+    names = []
+    for i in range(count):
+        name = join(path, f"file{i}.txt")
+        with open(name, 'w') as f:
+            f.write(f"{i}\n")
+        names.append(name)
+    return names
+
+
+def _idle_cpu(seconds: float) -> float:
+    """Run the event loop and return the CPU usage. (%)"""
+    from core.QtModules import QCoreApplication, QTimer
+    app = QCoreApplication.instance()
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    t0 = perf_counter()
+    c0 = process_time()
+    app.exec_()
+    return (process_time() - c0) / (perf_counter() - t0) * 100
+
+
+def _polling_cpu(names: Sequence[str], seconds: float) -> float:
+    """Stat the files every 1 ms and return the CPU usage. (%)"""
+    stopped = False
+
+    def run():
+        while not stopped:
+            for name in names:
+                stat(name)
+            sleep(0.001)
+
+    thread = Thread(target=run)
+    t0 = perf_counter()
+    c0 = process_time()
+    thread.start()
+    sleep(seconds)
+    stopped = True
+    thread.join()
+    return (process_time() - c0) / (perf_counter() - t0) * 100
+
+
+def bench_watch(counts: Sequence[int], seconds: float):
+    """Print the CPU usage of watching the files."""
+    from core.QtModules import QCoreApplication
+    from core.file_keeper import FileKeeper
+    from core.parsers.node import Node
+    global app
+    app = QCoreApplication(sys.argv)
+    print(f"{'files':>8} {'keeper':>10} {'fallback':>10} {'polling':>10}")
+    for count in counts:
+        with TemporaryDirectory() as path:
+            names = _make_files(path, count)
+            keeper = FileKeeper(None)
+            keeper.add_paths({name: Node(name, name, '') for name in names})
+            cpu = _idle_cpu(seconds)
+            fallback = len(keeper.poller.files)
+            keeper.stop()
+            keeper.wait()
+            keeper.deleteLater()
+            polling = _polling_cpu(names, seconds)
+        print(f"{count:>8} {cpu:>9.2f}% {fallback:>10} {polling:>9.2f}%")
+
+
+def _make_project(path: str, count: int) -> str:
+    """Write a project with Markdown and Python files, return its name."""
+    from core.data_structure import DataDict
+    from core.parsers import save_file
+    from core.parsers.node import Node
+    proj_name = join(path, "project.kmol")
+    data = DataDict()
+    root = Node("project", proj_name, '1')
+    data[1] = "@others\n"
+    for i in range(count):
+        suffix_text = 'md' if i % 2 else 'py'
+        file_name = f"file{i}.{suffix_text}"
+        with open(join(path, file_name), 'w') as f:
+            f.write(_MARKDOWN if suffix_text == 'md' else _PYTHON)
+        root.addChild(Node(file_name, file_name, str(i + 2)))
+        data[i + 2] = ""
+    save_file(root, data)
+    return proj_name
+
+
+def _drop_caches():
+    """Drop the page cache of Linux, root is required."""
+    sync()
+    with open('/proc/sys/vm/drop_caches', 'w') as f:
+        f.write('3')
+
+
+def _load(proj_name: str, workers: Optional[int], cold: bool) -> float:
+    """Load the project, return the cost time.
+
+    The files are read by the given number of workers.
+    """
+    from core import parsers
+    from core.data_structure import DataDict
+    from core.parsers.node import Node
+    if cold:
+        _drop_caches()
+    executor = partial(ThreadPoolExecutor, max_workers=workers)
+    with patch.object(parsers, 'ThreadPoolExecutor', executor):
+        with open(devnull, 'w') as f, redirect_stdout(f):
+            t0 = perf_counter()
+            parsers.parse(Node("project", proj_name, ''), DataDict())
+            return perf_counter() - t0
+
+
+def bench_load(count: int, repeat: int, cold: bool):
+    """Print the time of loading a synthetic project."""
+    with TemporaryDirectory() as path:
+        with open(devnull, 'w') as f, redirect_stdout(f):
+            proj_name = _make_project(path, count)
+        # Warm up the disk cache.
+        _load(proj_name, None, False)
+        serial = min(_load(proj_name, 1, cold) for _ in range(repeat))
+        pool = min(_load(proj_name, None, cold) for _ in range(repeat))
+    print(f"files: {count}, CPUs: {cpu_count()}, {'cold' if cold else 'warm'} cache")
+    print(f"one worker:  {serial:.3f} s")
+    print(f"thread pool: {pool:.3f} s")
+    print(f"speedup:     {serial / pool:.2f}x")
+
+
+def _open(proj_name: str, cache: bool) -> float:
+    """Open the project, return the cost time."""
+    from core.parsers import parse
+    from core.data_structure import DataDict
+    from core.parsers.node import Node
+    with open(devnull, 'w') as f, redirect_stdout(f):
+        t0 = perf_counter()
+        parse(Node("project", proj_name, ''), DataDict(), cache=cache)
+        return perf_counter() - t0
+
+
+def bench_cache(count: int, repeat: int):
+    """Print the time of opening a synthetic project with the cache file."""
+    from core.parsers.cache import _cache_path
+    with TemporaryDirectory() as path:
+        with open(devnull, 'w') as f, redirect_stdout(f):
+            proj_name = _make_project(path, count)
+        cache_name = _cache_path(proj_name)
+        # Warm up the disk cache.
+        _open(proj_name, False)
+        plain = min(_open(proj_name, False) for _ in range(repeat))
+        cold = []
+        for _ in range(repeat):
+            if isfile(cache_name):
+                remove(cache_name)
+            # The cache file is written here.
+            cold.append(_open(proj_name, True))
+        warm = min(_open(proj_name, True) for _ in range(repeat))
+    print(f"files: {count}")
+    print(f"no cache:   {plain:.3f} s")
+    print(f"cold cache: {min(cold):.3f} s")
+    print(f"warm cache: {warm:.3f} s")
+    print(f"speedup:    {plain / warm:.2f}x")
+
+
+def _random_text(r: Random) -> str:
+    """Return a random text with the special characters of YAML."""
+    lines = []
+    for _ in range(r.randint(0, 8)):
+        lines.append(''.join(r.choice(_YAML_CHARS) for _ in range(r.randint(0, 40))))
+    return '\n'.join(lines) + r.choice(['', '\n', '\n\n', ' ', '\n '])
+
+
+def _random_project(proj_name: str, count: int, r: Random) -> Tuple[Any, Any]:
+    """Return the root node and the data of a random project without files."""
+    from core.data_structure import DataDict
+    from core.parsers.node import Node
+    data = DataDict()
+    root = Node("project", proj_name, '1')
+    data[1] = _random_text(r)
+    nodes = [root]
+    for code in range(2, count + 2):
+        node = Node(_random_text(r).replace('\n', ' ')[:20], '', str(code))
+        data[code] = _random_text(r)
+        r.choice(nodes).addChild(node)
+        nodes.append(node)
+    return root, data
+
+
+def _save(root: Any, data: Any) -> Tuple[bytes, float]:
+    """Save the project again, return its content and the cost time."""
+    from core.parsers import save_file
+    data.set_saved(int(root.text(2)), False)
+    with open(devnull, 'w') as f, redirect_stdout(f):
+        t0 = perf_counter()
+        save_file(root, data)
+        t = perf_counter() - t0
+    with open(root.text(1), 'rb') as f:
+        return f.read(), t
+
+
+def bench_yaml(count: int, projects: int, seed: int):
+    """Print the time of the C and the pure Python YAML dumpers and loaders."""
+    import yaml
+    from yaml.representer import SafeRepresenter
+    from core import parsers
+    if not yaml.__with_libyaml__:
+        print("LibYAML is not available.")
+        return
+    # The same representer of the C dumper.
+    yaml.add_representer(
+        parsers._LiteralDoc,
+        parsers._str_style('|', SafeRepresenter.represent_str),
+        Dumper=yaml.SafeDumper
+    )
+    print(f"{'seed':>6} {'size':>10} {'C dump':>8} {'Py dump':>8} {'C load':>8} {'Py load':>8} identical")
+    different = 0
+    with TemporaryDirectory() as path:
+        for i in range(seed, seed + projects):
+            root, data = _random_project(join(path, f"project{i}.kmol"), count, Random(i))
+            doc_c, dump_c = _save(root, data)
+            with patch.object(parsers, '_Dumper', yaml.SafeDumper):
+                doc_py, dump_py = _save(root, data)
+            text = doc_c.decode('utf-8')
+            t0 = perf_counter()
+            data_c = yaml.load(text, Loader=yaml.CSafeLoader)
+            load_c = perf_counter() - t0
+            t0 = perf_counter()
+            data_py = yaml.load(text, Loader=yaml.SafeLoader)
+            load_py = perf_counter() - t0
+            identical = doc_c == doc_py and data_c == data_py
+            different += not identical
+            print(
+                f"{i:>6} {len(doc_c):>10} {dump_c:>7.3f}s {dump_py:>7.3f}s "
+                f"{load_c:>7.3f}s {load_py:>7.3f}s {'yes' if identical else 'NO'}"
+            )
+    if different:
+        raise SystemExit(f"{different} project(s) are different.")
+
+
+def _random_prose(size: int, r: Random) -> str:
+    """Return a random text like prose with about the given characters."""
+    lines = []
+    length = 0
+    while length < size:
+        line = ' '.join(r.choice(_WORDS) for _ in range(r.randint(4, 16))).capitalize() + "."
+        if r.random() < 0.2:
+            line += "\n"
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines) + "\n"
+
+
+def _open_all(proj_name: str) -> Tuple[float, float]:
+    """Open the project and read all data, return the cost time of both."""
+    from core.parsers import parse, _tree_codes
+    from core.data_structure import DataDict
+    from core.parsers.node import Node
+    root = Node("project", proj_name, '')
+    data = DataDict()
+    with open(devnull, 'w') as f, redirect_stdout(f):
+        t0 = perf_counter()
+        parse(root, data)
+        t1 = perf_counter()
+        for code in _tree_codes(root):
+            data[code]
+        t2 = perf_counter()
+    return t1 - t0, t2 - t0
+
+
+def bench_compress(count: int, size: int, repeat: int, seed: int):
+    """Print the file size and time of each compression method."""
+    from core.data_structure import DataDict
+    from core.parsers import save_file
+    from core.parsers.node import Node
+    r = Random(seed)
+    texts = [_random_prose(size, r) for _ in range(count)]
+    print(f"nodes: {count}, text size: {size}, seed: {seed}")
+    print(f"{'method':>8} {'size':>10} {'ratio':>6} {'save':>8} {'open':>8} {'read all':>9}")
+    plain_size = 0
+    with TemporaryDirectory() as path:
+        for compression in (None, 'zlib', 'lzma'):
+            proj_name = join(path, f"{compression}.kmol")
+            root = Node("project", proj_name, '1')
+            data = DataDict()
+            data[1] = "@others\n"
+            for i, text in enumerate(texts):
+                root.addChild(Node(f"node{i}", '', str(i + 2)))
+                data[i + 2] = text
+            save_time = []
+            for _ in range(repeat):
+                # Write all blocks again.
+                for code in range(1, count + 2):
+                    data.set_saved(code, False)
+                with open(devnull, 'w') as f, redirect_stdout(f):
+                    t0 = perf_counter()
+                    save_file(root, data, compression=compression)
+                    save_time.append(perf_counter() - t0)
+            file_size = getsize(proj_name)
+            if compression is None:
+                plain_size = file_size
+            open_time, read_time = map(min, zip(*(_open_all(proj_name) for _ in range(repeat))))
+            print(
+                f"{compression or 'none':>8} {file_size:>10} {file_size / plain_size:>6.3f} "
+                f"{min(save_time):>7.3f}s {open_time:>7.3f}s {read_time:>8.3f}s"
+            )
+
+
+def main(argv: Sequence[str]):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    subparsers = parser.add_subparsers(dest='command')
+    watch = subparsers.add_parser('watch', help="CPU usage of the file keeper")
+    watch.add_argument('-n', '--count', type=int, nargs='+', default=[10, 1000, 10000])
+    watch.add_argument('-t', '--time', type=float, default=5., help="seconds of each run")
+    load = subparsers.add_parser('load', help="time of loading a project")
+    load.add_argument('-n', '--count', type=int, default=1000)
+    load.add_argument('-r', '--repeat', type=int, default=3)
+    load.add_argument('--cold', action='store_true', help="drop the page cache before each run (Linux, root)")
+    cache = subparsers.add_parser('cache', help="time of opening a project with the cache file")
+    cache.add_argument('-n', '--count', type=int, default=1000)
+    cache.add_argument('-r', '--repeat', type=int, default=3)
+    yml = subparsers.add_parser('yaml', help="time and output of the C and pure Python YAML dumpers")
+    yml.add_argument('-n', '--count', type=int, default=5000, help="nodes of each project")
+    yml.add_argument('-p', '--projects', type=int, default=3)
+    yml.add_argument('-s', '--seed', type=int, default=0, help="seed of the first project")
+    compress = subparsers.add_parser('compress', help="size and time of the compression methods")
+    compress.add_argument('-n', '--count', type=int, default=200, help="nodes of the project")
+    compress.add_argument('--size', type=int, default=20000, help="characters of each node")
+    compress.add_argument('-r', '--repeat', type=int, default=3)
+    compress.add_argument('-s', '--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    # The core modules parse the arguments of editor when imported.
+    del sys.argv[1:]
+    if args.command == 'watch':
+        bench_watch(args.count, args.time)
+    elif args.command == 'load':
+        bench_load(args.count, args.repeat, args.cold)
+    elif args.command == 'cache':
+        bench_cache(args.count, args.repeat)
+    elif args.command == 'yaml':
+        bench_yaml(args.count, args.projects, args.seed)
+    elif args.command == 'compress':
+        bench_compress(args.count, args.size, args.repeat, args.seed)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
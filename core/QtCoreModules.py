@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""The Qt objects without GUI.
+
+The modules used by the build command import from here,
+so the widget libraries are not loaded without display.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from PyQt5.QtCore import (
+    pyqtSignal,
+    pyqtSlot,
+    qVersion,
+    PYQT_VERSION_STR,
+    QObject,
+    QThread,
+    QTimer,
+    QFileInfo,
+    QDir,
+    QFileSystemWatcher,
+)
+
+Signal = pyqtSignal
+Slot = pyqtSlot
+
+__all__ = [
+    'Signal',
+    'Slot',
+    'qVersion',
+    'PYQT_VERSION_STR',
+    'QObject',
+    'QThread',
+    'QTimer',
+    'QFileInfo',
+    'QDir',
+    'QFileSystemWatcher',
+]
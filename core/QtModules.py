@@ -80,6 +80,7 @@ __all__ = [
     'QDoubleSpinBox',
     'QFileDialog',
     'QFileInfo',
+    'QFileSystemWatcher',
     'QFont',
     'QFontMetrics',
     'QGraphicsScene',
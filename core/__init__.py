@@ -7,18 +7,26 @@ __copyright__ = "Copyright (C) 2018-2019"
 __license__ = "AGPL"
 __email__ = "pyslvs@gmail.com"
 
-from sys import exit
+from sys import argv, exit
 import platform
-from .main_window import MainWindow
-from .info import ARGUMENTS
-from .QtModules import QApplication
 
 __all__ = ['main']
 
 
 def main():
-    """Startup function."""
+    """Startup function.
+
+    The GUI modules are imported after the build command is checked,
+    so the build command does not create any widget.
+    """
     global app
+    if argv[1:2] == ['build']:
+        from .build import main as build_main
+        exit(build_main(argv[2:]))
+
+    from .main_window import MainWindow
+    from .info import ARGUMENTS
+    from .QtModules import QApplication
     if ARGUMENTS.test:
         print("All module loaded successfully.")
         exit(0)
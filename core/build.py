@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""Build command of kmol editor.
+
+Tangle the files of projects without GUI:
+
+    kmol build [-j JOBS] project.kmol ...
+
+The projects are independent, so they are built on a process pool.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, Sequence, Optional
+import sys
+import argparse
+from os import cpu_count
+from os.path import basename, exists
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from core.data_structure import DataDict
+from core.parsers import parse, save_file
+from core.parsers.node import Node
+
+
+def build(proj_name: str):
+    """Parse the project and write all of its files."""
+    if not exists(proj_name):
+        raise FileNotFoundError(f"No such project: '{proj_name}'")
+    data = DataDict()
+    root_node = Node(basename(proj_name).split('.')[0], proj_name, '')
+    parse(root_node, data)
+    save_file(root_node, data, tangle=True)
+
+
+def _build_job(proj_name: str) -> Tuple[str, float, Optional[str]]:
+    """Build the project in worker process.
+
+    Return the project name, the cost time and the error message.
+    """
+    t0 = perf_counter()
+    try:
+        build(proj_name)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    else:
+        error = None
+    return proj_name, perf_counter() - t0, error
+
+
+def main(argv: Sequence[str]) -> int:
+    """Build command, return the exit status."""
+    parser = argparse.ArgumentParser(
+        prog="kmol build",
+        description="Tangle the files of Kmol projects without GUI."
+    )
+    parser.add_argument(
+        'projects',
+        metavar="project",
+        nargs='+',
+        type=str,
+        help="path of the project"
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        metavar="JOBS",
+        type=int,
+        default=cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)"
+    )
+    args = parser.parse_args(argv)
+    # Remove the duplicated projects but keep the order.
+    projects = list(dict.fromkeys(args.projects))
+    jobs = max(1, min(args.jobs, len(projects)))
+    t0 = perf_counter()
+    if jobs == 1:
+        results = [_build_job(proj_name) for proj_name in projects]
+    else:
+        with ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(_build_job, projects))
+    # Timing report.
+    status = 0
+    width = max(len(proj_name) for proj_name in projects)
+    print(f"Build report ({jobs} job{'s' if jobs > 1 else ''}):")
+    for proj_name, cost, error in results:
+        if error is None:
+            print(f"  {proj_name:<{width}}  {cost:8.3f} s  OK")
+        else:
+            print(f"  {proj_name:<{width}}  {cost:8.3f} s  FAILED")
+            print(f"Build Error: {proj_name}: {error}", file=sys.stderr)
+            status = 1
+    failed = sum(error is not None for _, _, error in results)
+    print(
+        f"Total: {len(results)} project(s), {failed} failed, "
+        f"{perf_counter() - t0:.3f} s"
+    )
+    return status
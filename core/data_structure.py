@@ -9,39 +9,238 @@ __email__ = "pyslvs@gmail.com"
 
 from typing import (
     ItemsView,
+    Tuple,
+    List,
+    Iterable,
     Hashable,
+    Callable,
     Dict,
+    Set,
     Union,
+    Optional,
     TypeVar,
+    IO,
 )
-from core.QtModules import Signal, QObject
+import re
+from os import linesep
+from tempfile import TemporaryFile
+from collections import OrderedDict
+from mmap import mmap, ACCESS_READ
+from array import array
+from bisect import bisect
+from core.QtCoreModules import Signal, QObject
 
 _VT = TypeVar('_VT')
+Buffer = Union[bytes, mmap]
+_NEWLINE = re.compile(b'\n')
+_NON_ASCII = re.compile(b'[\x80-\xff]')
+
+
+def _line_starts(doc: Buffer) -> array:
+    """Return the start offsets of lines."""
+    starts = array('q', [0])
+    starts.extend(m.end() for m in _NEWLINE.finditer(doc))
+    return starts
+
+
+class LineIndex:
+
+    """Line index of UTF-8 encoded document.
+
+    The start offsets of lines are built once,
+    then the byte offsets can be converted to (line, index) in one call.
+    The index is counted in characters as same as QScintilla.
+    """
+
+    def __init__(self, doc: Buffer, starts: Optional[array] = None):
+        self.doc = doc
+        self.starts = _line_starts(doc) if starts is None else starts
+
+    def line_of(self, offset: int) -> int:
+        """Return the line number of the byte offset."""
+        return bisect(self.starts, offset) - 1
+
+    def positions(self, offsets: Iterable[int]) -> List[Tuple[int, int]]:
+        """Convert the byte offsets to (line, index) pairs."""
+        starts = self.starts
+        doc = self.doc
+        pairs = []
+        for offset in offsets:
+            line = bisect(starts, offset) - 1
+            start = starts[line]
+            prefix = doc[start:offset]
+            if _NON_ASCII.search(prefix) is None:
+                pairs.append((line, offset - start))
+            else:
+                pairs.append((line, len(prefix.decode('utf-8', 'ignore'))))
+        return pairs
+
+
+class MappedText:
+
+    """Read-only text file mapped into memory.
+
+    The start offsets of lines are indexed once,
+    so the lines can be decoded by windows.
+    """
+
+    def __init__(self, file_name: str):
+        with open(file_name, 'rb') as f:
+            self.buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+        self.offsets = _line_starts(self.buffer)
+        if self.offsets[-1] != len(self.buffer):
+            self.offsets.append(len(self.buffer))
+
+    def line_count(self) -> int:
+        """Return the number of lines."""
+        return len(self.offsets) - 1
+
+    def line_of(self, offset: int) -> int:
+        """Return the line number of the byte offset."""
+        return bisect(self.offsets, offset) - 1
+
+    def line_index(self) -> LineIndex:
+        """Return the line index of the mapped text."""
+        return LineIndex(self.buffer, self.offsets)
+
+    def text(self, start: int = 0, end: Optional[int] = None) -> str:
+        """Decode the lines from start to end. (exclusive)"""
+        count = self.line_count()
+        if end is None or end > count:
+            end = count
+        if start >= end:
+            return ""
+        return self.buffer[self.offsets[start]:self.offsets[end]].decode('utf-8', 'replace')
+
+    def close(self):
+        """Release the mapped memory."""
+        self.buffer.close()
+
+
+class _BlobPool:
+
+    """Shared texts with reference counts.
+
+    The texts are addressed by their content hash,
+    so the identical texts of different keys are stored once.
+    """
+
+    def __init__(self):
+        # {text: [shared text, reference count]}
+        self.blobs: Dict[str, List[Union[str, int]]] = {}
+
+    def acquire(self, text: str) -> str:
+        """Return the shared text and increase its reference count."""
+        blob = self.blobs.get(text)
+        if blob is None:
+            self.blobs[text] = [text, 1]
+            return text
+        blob[1] += 1
+        return blob[0]
+
+    def release(self, text: str):
+        """Decrease the reference count, remove the text if it is unused."""
+        blob = self.blobs[text]
+        blob[1] -= 1
+        if not blob[1]:
+            del self.blobs[text]
+
+    def clear(self):
+        """Remove all texts."""
+        self.blobs.clear()
 
 
 class DataDict(QObject):
 
-    """A wrapper class contain the data of nodes."""
+    """A wrapper class contain the data of nodes.
+
+    The data can be loaded on demand by a loader function,
+    the data stored by the loader is treated as saved.
+
+    The large files are kept as read-only mapped text,
+    they are only decoded when the whole text is needed.
+
+    The identical texts are shared between the keys,
+    and a key is detached from the shared text when it is changed.
+
+    The editor tells whether its text is changed,
+    so the "replace" method stores the text without comparison.
+
+    The unsaved keys are kept in a set, and grouped by their root keys,
+    so the saved status can be checked without scanning all the data.
+    The "not_saved" and "all_saved" signals are only emitted
+    when the status of whole data is changed.
+
+    The saved texts of files can be evicted by the least recently used order
+    if their total length is over the budget. The evicted texts are written to
+    a temporary file, then read back when needed, so they are still the texts
+    that user has seen even if the files are changed by other programs.
+    """
 
     not_saved = Signal()
     all_saved = Signal()
 
-    def __init__(self):
+    def __init__(self, budget: int = 0):
+        """The budget is counted in characters, zero means unlimited."""
         super(DataDict, self).__init__()
         self.__data: Dict[Hashable, str] = {}
-        self.__saved: Dict[Hashable, bool] = {}
+        self.__pool = _BlobPool()
+        self.__unsaved: Set[Hashable] = set()
+        self.__roots: Dict[Hashable, Hashable] = {}
+        self.__root_unsaved: Dict[Hashable, Set[Hashable]] = {}
         self.__pos: Dict[Hashable, int] = {}
+        self.__formats: Dict[Hashable, Tuple[str, str]] = {}
+        self.__origins: Dict[Hashable, Hashable] = {}
+        self.__blocks: Dict[Hashable, Hashable] = {}
         self.__macros: Dict[str, Hashable] = {}
+        self.__macro_names: Dict[Hashable, Set[str]] = {}
+        self.__loaders: Dict[Hashable, Callable[[], None]] = {}
+        self.__loading = False
+        self.__mapped: Dict[Hashable, MappedText] = {}
+        self.__budget = budget
+        self.__evictable: Set[Hashable] = set()
+        # {key: length of text} in the least recently used order.
+        self.__resident: 'OrderedDict[Hashable, int]' = OrderedDict()
+        self.__resident_size = 0
+        self.__spill: Optional[IO[bytes]] = None
+        # {key: (offset, length)} of the evicted texts in the temporary file.
+        self.__spilled: Dict[Hashable, Tuple[int, int]] = {}
+        self.__next_code = 1
 
     def clear(self):
         """Clear data."""
         self.__data.clear()
-        self.__saved.clear()
+        self.__pool.clear()
+        self.__unsaved.clear()
+        self.__roots.clear()
+        self.__root_unsaved.clear()
         self.__pos.clear()
+        self.__formats.clear()
+        self.__origins.clear()
+        self.__blocks.clear()
         self.__macros.clear()
+        self.__macro_names.clear()
+        self.__loaders.clear()
+        for mapped in self.__mapped.values():
+            mapped.close()
+        self.__mapped.clear()
+        self.__evictable.clear()
+        self.__resident.clear()
+        self.__resident_size = 0
+        self.__spilled.clear()
+        if self.__spill is not None:
+            self.__spill.close()
+            self.__spill = None
+        self.__next_code = 1
 
     def __getitem__(self, key: Hashable) -> str:
         """Get item string."""
+        if key in self.__loaders:
+            self.load(key)
+        elif key in self.__evictable:
+            self.__touch(key)
+        if key in self.__mapped:
+            return self.__mapped[key].text()
         if key in self.__data:
             return self.__data[key]
         else:
@@ -49,10 +248,69 @@ class DataDict(QObject):
 
     def __setitem__(self, key: Hashable, context: str):
         """Set item."""
-        self.__saved[key] = self[key] == context
-        if not self.__saved[key]:
-            self.not_saved.emit()
-        self.__data[key] = context
+        if self.__loading:
+            self.__store(key, context)
+            self.__mark(key, True)
+            return
+        old_context = self[key]
+        if old_context is not context and old_context != context:
+            self.__changed(key)
+        self.__store(key, context)
+
+    def replace(self, key: Hashable, context: str):
+        """Set the item that is known as changed.
+
+        The comparison with the old text is skipped,
+        used when the modified state is tracked by the editor.
+        """
+        self.__loaders.pop(key, None)
+        self.__changed(key)
+        self.__store(key, context)
+
+    def __changed(self, key: Hashable):
+        """Mark the changed key as unsaved."""
+        self.__forget(key)
+        self.__blocks.pop(key, None)
+        self.__mark(key, False)
+
+    def __mark(self, key: Hashable, saved: bool):
+        """Change the saved status of the key.
+
+        Emit the signals if the status of whole data is changed.
+        """
+        if saved:
+            if key not in self.__unsaved:
+                return
+            self.__discard(key)
+            if not self.__unsaved:
+                self.all_saved.emit()
+        else:
+            if key in self.__unsaved:
+                return
+            all_saved = not self.__unsaved
+            self.__unsaved.add(key)
+            self.__root_unsaved.setdefault(self.__roots.get(key, key), set()).add(key)
+            if all_saved:
+                self.not_saved.emit()
+
+    def __discard(self, key: Hashable):
+        """Remove the key from the unsaved keys."""
+        self.__unsaved.remove(key)
+        root = self.__roots.get(key, key)
+        keys = self.__root_unsaved[root]
+        keys.remove(key)
+        if not keys:
+            del self.__root_unsaved[root]
+
+    def __store(self, key: Hashable, context: str):
+        """Point the key to the shared text."""
+        old_context = self.__data.get(key)
+        if old_context is not None:
+            self.__pool.release(old_context)
+        elif type(key) is int and key >= self.__next_code:
+            # The new numbers are counted after the largest code.
+            self.__next_code = key + 1
+        self.__data[key] = self.__pool.acquire(context)
 
     def __delitem__(self, key: Hashable):
         """Delete the key."""
@@ -81,59 +339,275 @@ class DataDict(QObject):
 
     def pop(self, key: Hashable, k: _VT = None) -> Union[Hashable, _VT]:
         """Delete the key and return the value."""
-        if key in self.__data:
-            data = self.__data.pop(key)
-            self.__saved.pop(key, None)
-            self.__pos.pop(key, None)
-            for m, code in tuple(self.__macros.items()):
-                if code == key:
-                    del self.__macros[m]
-            return data
-        return k
+        if key not in self.__data:
+            return k
+        all_saved = self.is_all_saved()
+        data = self.__remove(key)
+        if not all_saved and self.is_all_saved():
+            self.all_saved.emit()
+        return data
+
+    def pop_many(self, keys: Iterable[Hashable]):
+        """Delete the keys.
+
+        The signal is emitted once if the whole data becomes saved.
+        """
+        all_saved = self.is_all_saved()
+        for key in keys:
+            if key in self.__data:
+                self.__remove(key)
+        if not all_saved and self.is_all_saved():
+            self.all_saved.emit()
+
+    def __remove(self, key: Hashable) -> str:
+        """Delete the key without signals and return the value."""
+        data = self.__data.pop(key)
+        self.__pool.release(data)
+        if key in self.__unsaved:
+            self.__discard(key)
+        self.__roots.pop(key, None)
+        self.__pos.pop(key, None)
+        self.__formats.pop(key, None)
+        self.__origins.pop(key, None)
+        self.__blocks.pop(key, None)
+        self.__loaders.pop(key, None)
+        mapped = self.__mapped.pop(key, None)
+        if mapped is not None:
+            mapped.close()
+        self.__forget(key)
+        for name in self.__macro_names.pop(key, ()):
+            del self.__macros[name]
+        return data
 
     def set_saved(self, key: Hashable, saved: bool):
         """Saved status adjustment."""
-        self.__saved[key] = saved
-        self.is_all_saved()
+        self.__mark(key, saved)
 
     def is_saved(self, key: Hashable) -> bool:
         """Return saved status."""
-        return self.__saved[key]
+        return key not in self.__unsaved
 
     def is_all_saved(self) -> bool:
         """Return True if all saved."""
-        all_saved = all(self.is_saved(key) for key in self.__data)
-        if all_saved:
-            self.all_saved.emit()
-        else:
-            self.not_saved.emit()
-        return all_saved
+        return not self.__unsaved
 
     def save_all(self):
         """Change all saved status."""
-        for key in self.__data:
-            self.__saved[key] = True
+        if not self.__unsaved:
+            return
+        self.__unsaved.clear()
+        self.__root_unsaved.clear()
         self.all_saved.emit()
 
+    def save_keys(self, keys: Iterable[Hashable]):
+        """Change the saved status of the keys.
+
+        The signal is emitted once if the whole data becomes saved.
+        """
+        all_saved = self.is_all_saved()
+        for key in keys:
+            if key in self.__unsaved:
+                self.__discard(key)
+        if not all_saved and self.is_all_saved():
+            self.all_saved.emit()
+
+    def set_root(self, keys: Iterable[Hashable], root: Hashable):
+        """Group the keys by the root key.
+
+        The keys without root are grouped by themselves.
+        """
+        for key in keys:
+            old_root = self.__roots.get(key, key)
+            self.__roots[key] = root
+            if old_root == root or key not in self.__unsaved:
+                continue
+            old_keys = self.__root_unsaved[old_root]
+            old_keys.remove(key)
+            if not old_keys:
+                del self.__root_unsaved[old_root]
+            self.__root_unsaved.setdefault(root, set()).add(key)
+
+    def save_root(self, root: Hashable):
+        """Change the saved status of the keys of the root."""
+        keys = self.__root_unsaved.pop(root, None)
+        if keys is None:
+            return
+        self.__unsaved.difference_update(keys)
+        if not self.__unsaved:
+            self.all_saved.emit()
+
+    def is_root_saved(self, root: Hashable) -> bool:
+        """Return True if all the keys of the root are saved."""
+        return root not in self.__root_unsaved
+
+    def set_loader(self, key: Hashable, loader: Callable[[], None]):
+        """Load the data of the key by the loader when it is needed."""
+        if key not in self.__data:
+            self.__store(key, "")
+        self.__mark(key, True)
+        self.__forget(key)
+        self.__loaders[key] = loader
+
+    def loader(self, key: Hashable) -> Optional[Callable[[], None]]:
+        """Return the loader of the key if it is not loaded."""
+        return self.__loaders.get(key)
+
+    def is_loaded(self, key: Hashable) -> bool:
+        """Return True if the data of the key is loaded."""
+        return key not in self.__loaders
+
+    def load(self, key: Hashable):
+        """Load the data of the key if it has a loader."""
+        loader = self.__loaders.pop(key, None)
+        if loader is None:
+            return
+        loading = self.__loading
+        self.__loading = True
+        try:
+            loader()
+        finally:
+            self.__loading = loading
+        if key in self.__evictable and key not in self.__loaders:
+            self.__touch(key)
+
+    def set_evictable(self, key: Hashable):
+        """Let the saved text of the key be evicted when over the budget."""
+        if key not in self.__data or key in self.__unsaved or key in self.__loaders:
+            return
+        self.__forget(key)
+        self.__evictable.add(key)
+        self.__touch(key)
+
+    def __touch(self, key: Hashable):
+        """Mark the evictable key as recently used.
+
+        Evict the least recently used texts if over the budget.
+        """
+        resident = self.__resident
+        if key in resident:
+            resident.move_to_end(key)
+            return
+        size = len(self.__data[key])
+        resident[key] = size
+        self.__resident_size += size
+        while self.__budget and self.__resident_size > self.__budget and len(resident) > 1:
+            old_key, old_size = resident.popitem(last=False)
+            self.__resident_size -= old_size
+            self.__evict(old_key)
+
+    def __evict(self, key: Hashable):
+        """Write the text to the temporary file if not written yet."""
+        if key not in self.__spilled:
+            if self.__spill is None:
+                self.__spill = TemporaryFile()
+            doc = self.__data[key].encode('utf-8', 'surrogatepass')
+            offset = self.__spill.seek(0, 2)
+            self.__spill.write(doc)
+            self.__spilled[key] = (offset, len(doc))
+        self.__store(key, "")
+        self.__loaders[key] = lambda: self.__restore(key)
+
+    def __restore(self, key: Hashable):
+        """Read the evicted text back."""
+        offset, length = self.__spilled[key]
+        self.__spill.seek(offset)
+        self[key] = self.__spill.read(length).decode('utf-8', 'surrogatepass')
+
+    def __forget(self, key: Hashable):
+        """The text of the key can not be evicted anymore."""
+        if key not in self.__evictable:
+            return
+        self.__evictable.remove(key)
+        size = self.__resident.pop(key, None)
+        if size is not None:
+            self.__resident_size -= size
+        else:
+            # Evicted text.
+            self.__loaders.pop(key, None)
+        if self.__spilled.pop(key, None) is not None and not self.__spilled:
+            # Drop the written texts that are not used.
+            self.__spill.truncate(0)
+
+    def set_mapped(self, key: Hashable, mapped: MappedText):
+        """Set a read-only mapped text to the key."""
+        self.__store(key, "")
+        self.__mark(key, True)
+        self.__forget(key)
+        old_mapped = self.__mapped.pop(key, None)
+        if old_mapped is not None:
+            old_mapped.close()
+        self.__mapped[key] = mapped
+
+    def mapped(self, key: Hashable) -> Optional[MappedText]:
+        """Return the mapped text of the key if exist."""
+        return self.__mapped.get(key)
+
     def new_num(self) -> int:
         """Get a unused number."""
-        i = hash('kmol')
-        while i in self.__data:
-            i = hash(str(i))
-        else:
-            self[i] = ""
-            return i
+        code, = self.reserve(1)
+        self[code] = ""
+        return code
+
+    def reserve(self, n: int) -> List[int]:
+        """Get n unused numbers in ascending order.
+
+        The numbers are counted after the largest code that has been stored
+        or reserved, so the same projects are numbered as same as last time.
+        """
+        code = self.__next_code
+        self.__next_code += n
+        return list(range(code, code + n))
 
     def add_macro(self, name: str, key: Hashable):
         """Add a macro."""
         if key not in self.__data:
             raise KeyError("{} is not in data.".format(key))
+        old_key = self.__macros.get(name)
+        if old_key is not None:
+            names = self.__macro_names[old_key]
+            names.discard(name)
+            if not names:
+                del self.__macro_names[old_key]
         self.__macros[name] = key
+        self.__macro_names.setdefault(key, set()).add(name)
 
     def macros(self) -> ItemsView[str, Hashable]:
         """Return macro scripts."""
         return self.__macros.items()
 
+    def set_file_format(self, key: Hashable, encoding: str, newline: str):
+        """Set the encoding and newline of the file of the key."""
+        self.__formats[key] = (encoding, newline)
+
+    def file_format(self, key: Hashable) -> Tuple[str, str]:
+        """Return the encoding and newline of the file of the key.
+
+        The new files are written in UTF-8 with the newline of the system.
+        """
+        return self.__formats.get(key, ('utf-8', linesep))
+
+    def set_origin(self, key: Hashable, origin: Hashable):
+        """Set the key of the renumbered key in its project file."""
+        if key == origin:
+            self.__origins.pop(key, None)
+        else:
+            self.__origins[key] = origin
+
+    def origin(self, key: Hashable) -> Hashable:
+        """Return the key in its project file."""
+        return self.__origins.get(key, key)
+
+    def set_block(self, key: Hashable, block: Hashable):
+        """Set the saved block of the text in project file.
+
+        The block is forgotten when the text is changed.
+        """
+        self.__blocks[key] = block
+
+    def block(self, key: Hashable) -> Optional[Hashable]:
+        """Return the saved block of the text if exist."""
+        return self.__blocks.get(key)
+
     def set_pos(self, key: Hashable, pos: int):
         """Set the scroll bar position of the data."""
         self.__pos[key] = pos
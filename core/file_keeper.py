@@ -1,62 +1,234 @@
 # -*- coding: utf-8 -*-
 
-"""The file keeper used to watch the file changes."""
+"""The file keeper used to watch the file changes.
+
+The changes are reported by the file system watcher (inotify on Linux).
+The polling thread is only used on the file systems
+that do not support notifications.
+
+Each file is recorded as (size, mtime_ns, content hash),
+so only the files with different content will be reported.
+"""
 
 __author__ = "Yuan Chang"
 __copyright__ = "Copyright (C) 2018-2019"
 __license__ = "AGPL"
 __email__ = "pyslvs@gmail.com"
 
-from typing import Sequence
+from typing import (
+    TYPE_CHECKING,
+    Tuple,
+    Iterable,
+    Dict,
+    Set,
+    Optional,
+)
 from os import stat
 from os.path import isfile
-from core.QtModules import (
+from threading import Lock
+from hashlib import blake2b
+from core.QtCoreModules import (
     Slot,
     Signal,
-    QWidget,
+    QObject,
     QThread,
-    QTreeWidgetItem,
+    QTimer,
+    QFileSystemWatcher,
 )
-from core.parsers import getpath
+if TYPE_CHECKING:
+    from core.parsers.node import TreeItem
 
+# Polling interval of the fallback thread. (ms)
+_POLLING_INTERVAL = 500
+# Debounce window to collect the changed files into one batch. (ms)
+_DEBOUNCE_INTERVAL = 300
 
-class FileKeeper(QThread):
+_Stat = Tuple[int, int]
 
-    """File keeper thread for each file."""
 
-    file_changed = Signal(str, QTreeWidgetItem)
+def _stat(path: str) -> _Stat:
+    """Return the size and modified time of the file."""
+    if not isfile(path):
+        return 0, 0
+    st = stat(path)
+    return st.st_size, st.st_mtime_ns
 
-    def __init__(self, nodes: Sequence[QTreeWidgetItem], parent: QWidget):
-        super(FileKeeper, self).__init__(parent)
-        self.finished.connect(self.deleteLater)
-        self.nodes = {}
-        self.files = {}
-        for node in nodes:
-            path = getpath(node)
-            self.nodes[path] = node
-            self.files[path] = stat(path).st_mtime
+
+def content_hash(doc: bytes = b'') -> blake2b:
+    """Return the content hash object, it can be updated incrementally."""
+    return blake2b(doc, digest_size=16)
+
+
+class _PollingThread(QThread):
+
+    """Polling fallback for the files that can not be watched."""
+
+    file_changed = Signal(str)
+
+    def __init__(self, parent: QObject):
+        super(_PollingThread, self).__init__(parent)
+        self.files: Dict[str, _Stat] = {}
+        self.lock = Lock()
         self.stopped = False
-        self.passed = False
+
+    def add(self, f: str):
+        """Add a file."""
+        with self.lock:
+            self.files[f] = _stat(f)
+
+    def remove(self, f: str):
+        """Remove a file."""
+        with self.lock:
+            self.files.pop(f, None)
 
     def run(self):
         """Watch the files."""
         while not self.stopped:
-            for f in self.files:
-                if self.passed or not isfile(f):
-                    continue
-                stemp = stat(f).st_mtime
-                if self.files[f] != stemp:
-                    self.file_changed.emit(f, self.nodes[f])
-                    self.files[f] = stemp
-            self.msleep(1)
+            with self.lock:
+                for f, stemp in self.files.items():
+                    stemp_new = _stat(f)
+                    if stemp != stemp_new:
+                        self.files[f] = stemp_new
+                        self.file_changed.emit(f)
+            self.msleep(_POLLING_INTERVAL)
+
+    @Slot()
+    def stop(self):
+        self.stopped = True
+
+
+class FileKeeper(QObject):
+
+    """File keeper of the loaded files.
+
+    The keeper is a long-lived service of the main window,
+    the parsers register the files by "add_paths" method,
+    and remove them by "remove_paths" method.
+
+    The changed files are collected in a debounce window,
+    then reported once with the paths of the batch.
+    """
+
+    files_changed = Signal(list)
+
+    def __init__(self, parent: Optional[QObject]):
+        super(FileKeeper, self).__init__(parent)
+        self.nodes: Dict[str, TreeItem] = {}
+        # The items are not hashable, keyed by their identities instead.
+        # The items are kept alive by "nodes", so the identities are unique.
+        self.paths: Dict[int, str] = {}
+        # The content hash is recorded when the file is read or saved.
+        self.files: Dict[str, Tuple[_Stat, Optional[bytes]]] = {}
+        self.stopped = False
+        self.changed: Set[str] = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(_DEBOUNCE_INTERVAL)
+        self.timer.timeout.connect(self.__flush)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.__check)
+        self.poller = _PollingThread(self)
+        self.poller.file_changed.connect(self.__check)
+
+    def add_paths(self, nodes: Dict[str, 'TreeItem']):
+        """Watch the files with their nodes."""
+        paths = []
+        for path, node in nodes.items():
+            if path in self.nodes:
+                del self.paths[id(self.nodes[path])]
+            else:
+                paths.append(path)
+            self.nodes[path] = node
+            self.paths[id(node)] = path
+            self.files[path] = (_stat(path), None)
+        if self.stopped or not paths:
+            return
+        for path in self.watcher.addPaths(paths):
+            self.poller.add(path)
+        if self.poller.files and not self.poller.isRunning():
+            self.poller.start()
+
+    def remove_paths(self, paths: Iterable[str]):
+        """Stop watching the files."""
+        removed = []
+        for path in paths:
+            if path not in self.nodes:
+                continue
+            del self.paths[id(self.nodes.pop(path))]
+            del self.files[path]
+            self.changed.discard(path)
+            self.poller.remove(path)
+            removed.append(path)
+        if removed:
+            self.watcher.removePaths(removed)
+
+    def path(self, node: 'TreeItem') -> Optional[str]:
+        """Return the watched path of the node."""
+        return self.paths.get(id(node))
 
     @Slot()
     def stop(self):
+        """Stop watching."""
         self.stopped = True
+        self.timer.stop()
+        watched = self.watcher.files()
+        if watched:
+            self.watcher.removePaths(watched)
+        self.poller.stop()
+
+    def wait(self):
+        """Wait for the polling fallback."""
+        self.poller.wait()
+
+    @Slot(str)
+    def __check(self, f: str):
+        """Compare the file with its record."""
+        if self.stopped or f not in self.files or not isfile(f):
+            return
+        if f not in self.poller.files and f not in self.watcher.files():
+            # Some editors replace the file, so the watch is dropped.
+            self.watcher.addPath(f)
+        stemp, digest = self.files[f]
+        stemp_new = _stat(f)
+        if stemp == stemp_new:
+            return
+        try:
+            with open(f, 'rb') as file:
+                digest_new = content_hash(file.read()).digest()
+        except OSError:
+            return
+        self.files[f] = (stemp_new, digest_new)
+        if digest == digest_new:
+            return
+        self.changed.add(f)
+        # Restart the window until the changes are quiet.
+        self.timer.start()
+
+    @Slot()
+    def __flush(self):
+        """Report the collected files."""
+        if self.stopped or not self.changed:
+            return
+        changed = sorted(self.changed)
+        self.changed.clear()
+        self.files_changed.emit(changed)
+
+    def has_path(self, path: str) -> bool:
+        """Return True if the path is watched."""
+        return path in self.nodes
+
+    def node(self, path: str) -> 'TreeItem':
+        """Return the node of the path."""
+        return self.nodes[path]
+
+    def learn(self, path: str, digest: bytes, stemp: Optional[_Stat] = None):
+        """Record the content hash of the file that just read or wrote by ourselves.
 
-    def set_passed(self, passed: bool):
-        """Skip checking."""
-        if not passed:
-            for f in self.files:
-                self.files[f] = stat(f).st_mtime
-        self.passed = passed
+        The stat should be taken before reading,
+        the current stat is used if not given.
+        """
+        if path not in self.files:
+            return
+        self.files[path] = (_stat(path) if stemp is None else stemp, digest)
+        self.changed.discard(path)
@@ -8,14 +8,10 @@ __license__ = "AGPL"
 __email__ = "pyslvs@gmail.com"
 __version__ = "19.06.0"
 
-from sys import version_info
+from sys import argv, version_info
 import platform
 import argparse
-from core.QtModules import (
-    qVersion,
-    PYQT_VERSION_STR,
-    QSCINTILLA_VERSION_STR,
-)
+from core.QtCoreModules import qVersion, PYQT_VERSION_STR
 
 _Qt_Version = qVersion().strip()
 _PyQt_Version = PYQT_VERSION_STR.strip()
@@ -27,7 +23,6 @@ INFO = (
     "Python Compiler: {}".format(platform.python_compiler()),
     "Qt Version: {}".format(_Qt_Version),
     "PyQt Version: {}".format(_PyQt_Version),
-    "QScintilla Version: {}".format(QSCINTILLA_VERSION_STR),
 )
 
 _POWEREDBY = (
@@ -71,4 +66,16 @@ _parser.add_argument(
     action='store_true',
     help="do not connect to GUI console when opening"
 )
-ARGUMENTS = _parser.parse_args()
+_parser.add_argument(
+    '-m',
+    '--memory-budget',
+    metavar="MB",
+    default=256,
+    type=int,
+    help="keep the saved file texts in this size, 0 is unlimited (default: 256)"
+)
+if argv[1:2] == ['build']:
+    # The arguments are parsed by the build command.
+    ARGUMENTS = _parser.parse_args([])
+else:
+    ARGUMENTS = _parser.parse_args()
@@ -73,6 +73,22 @@ class Ui_MainWindow(object):
         self.hard_wrap_option = QtWidgets.QCheckBox(self.tree_widget)
         self.hard_wrap_option.setObjectName("hard_wrap_option")
         self.horizontalLayout_6.addWidget(self.hard_wrap_option)
+        self.lazy_loading_option = QtWidgets.QCheckBox(self.tree_widget)
+        self.lazy_loading_option.setObjectName("lazy_loading_option")
+        self.horizontalLayout_6.addWidget(self.lazy_loading_option)
+        self.project_cache_option = QtWidgets.QCheckBox(self.tree_widget)
+        self.project_cache_option.setObjectName("project_cache_option")
+        self.horizontalLayout_6.addWidget(self.project_cache_option)
+        self.sharded_project_option = QtWidgets.QCheckBox(self.tree_widget)
+        self.sharded_project_option.setObjectName("sharded_project_option")
+        self.horizontalLayout_6.addWidget(self.sharded_project_option)
+        self.edit_journal_option = QtWidgets.QCheckBox(self.tree_widget)
+        self.edit_journal_option.setChecked(True)
+        self.edit_journal_option.setObjectName("edit_journal_option")
+        self.horizontalLayout_6.addWidget(self.edit_journal_option)
+        self.compress_data_option = QtWidgets.QCheckBox(self.tree_widget)
+        self.compress_data_option.setObjectName("compress_data_option")
+        self.horizontalLayout_6.addWidget(self.compress_data_option)
         spacerItem2 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout_6.addItem(spacerItem2)
         self.expand_button = QtWidgets.QPushButton(self.tree_widget)
@@ -233,6 +249,11 @@ class Ui_MainWindow(object):
         self.auto_expand_option.setText(_translate("MainWindow", "Auto Expand"))
         self.trailing_blanks_option.setText(_translate("MainWindow", "Remove Trailing Blanks"))
         self.hard_wrap_option.setText(_translate("MainWindow", "Hard Wrap"))
+        self.lazy_loading_option.setText(_translate("MainWindow", "Lazy Loading"))
+        self.project_cache_option.setText(_translate("MainWindow", "Project Cache"))
+        self.sharded_project_option.setText(_translate("MainWindow", "Sharded Project"))
+        self.edit_journal_option.setText(_translate("MainWindow", "Edit Journal"))
+        self.compress_data_option.setText(_translate("MainWindow", "Compress Data"))
         self.expand_button.setText(_translate("MainWindow", "Expand to Level"))
         self.tree_main.headerItem().setText(0, _translate("MainWindow", "Name"))
         self.tree_main.headerItem().setText(1, _translate("MainWindow", "Path"))
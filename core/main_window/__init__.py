@@ -9,6 +9,7 @@ __email__ = "pyslvs@gmail.com"
 
 from typing import (
     Tuple,
+    Set,
     Dict,
     Sequence,
     Optional,
@@ -28,6 +29,7 @@ from subprocess import check_output
 from platform import system
 from core.QtModules import (
     Slot,
+    Qt,
     QTextCursor,
     QPoint,
     QTreeItem,
@@ -35,6 +37,7 @@ from core.QtModules import (
     QTreeWidgetItem,
     QListWidgetItem,
     QMessageBox,
+    QProgressDialog,
     QUrl,
     QFileDialog,
     QStandardPaths,
@@ -48,19 +51,25 @@ from core.QtModules import (
     HIGHLIGHTER_SUFFIX,
     HIGHLIGHTER_FILENAME,
 )
-from core.info import INFO, ARGUMENTS
-from core.file_keeper import FileKeeper
+from core.info import ARGUMENTS
+from core.data_structure import LineIndex
 from core.parsers import (
     getpath,
+    project_of,
+    journal_key,
+    append_journal,
+    read_journal,
+    discard_journal,
+    clear_journal,
     parse,
+    set_root,
     save_file,
     file_suffix,
-    file_icon,
     PandocTransformThread,
     SUPPORT_FILE_FORMATS,
-    LOADED_FILES,
 )
-from .custom import MainWindowBase
+from core.parsers.widget import file_icon
+from .custom import INFO, MainWindowBase
 
 
 def _get_root(node: QTreeWidgetItem) -> QTreeWidgetItem:
@@ -78,7 +87,12 @@ def _str_between(s: str, front: str, back: str) -> str:
 
 
 def _expand_recursive(node: QTreeWidgetItem):
-    """Expand node and its children."""
+    """Expand node and its children.
+
+    The nodes without children are skipped, so the lazy nodes are not loaded.
+    """
+    if not node.childCount():
+        return
     node.setExpanded(True)
     for i in range(node.childCount()):
         _expand_recursive(node.child(i))
@@ -95,6 +109,11 @@ class MainWindow(MainWindowBase):
             self.auto_expand_option,
             self.trailing_blanks_option,
             self.hard_wrap_option,
+            self.lazy_loading_option,
+            self.project_cache_option,
+            self.sharded_project_option,
+            self.edit_journal_option,
+            self.compress_data_option,
             self.wrap_around,
             self.match_case_option,
             self.whole_word_option,
@@ -135,13 +154,20 @@ class MainWindow(MainWindowBase):
     def dropEvent(self, event):
         """Drop file in to our window."""
         for url in event.mimeData().urls():
-            file_name = url.toLocalFile()
+            file_name = project_of(url.toLocalFile())
             self.env = QFileInfo(file_name).absolutePath()
             index = self.__in_widget(file_name)
             if index == -1:
                 root_node = QTreeRoot(QFileInfo(file_name).baseName(), file_name, '')
                 self.tree_main.addTopLevelItem(root_node)
-                parse(root_node, self.data)
+                parse(
+                    root_node,
+                    self.data,
+                    self.keeper,
+                    lazy=self.lazy_loading_option.isChecked(),
+                    cache=self.project_cache_option.isChecked()
+                )
+                self.__recover(root_node)
                 self.tree_main.setCurrentItem(root_node)
             else:
                 self.tree_main.setCurrentIndex(index)
@@ -151,7 +177,11 @@ class MainWindow(MainWindowBase):
 
     def closeEvent(self, event):
         """Close event."""
-        if not self.__ask_exit():
+        roots = [
+            self.tree_main.topLevelItem(i)
+            for i in range(self.tree_main.topLevelItemCount())
+        ]
+        if not self.__ask_exit(roots):
             event.ignore()
             return
 
@@ -166,9 +196,12 @@ class MainWindow(MainWindowBase):
         self.keeper.wait()
         event.accept()
 
-    def __ask_exit(self) -> bool:
-        """Ask when exit. Return True if the user want to leave."""
-        if self.data.is_all_saved():
+    def __ask_exit(self, roots: Sequence[QTreeWidgetItem]) -> bool:
+        """Ask when exit. Return True if the user want to leave.
+
+        The journals of the roots are removed if the changes are discarded.
+        """
+        if all(self.data.is_root_saved(int(root.text(2))) for root in roots):
             return True
 
         reply = QMessageBox.question(
@@ -182,6 +215,8 @@ class MainWindow(MainWindowBase):
             self.save_proj()
             return True
         elif reply == QMessageBox.Discard:
+            for root in roots:
+                clear_journal(root.text(1))
             return True
         else:
             return False
@@ -189,10 +224,10 @@ class MainWindow(MainWindowBase):
     @Slot()
     def close_proj(self):
         """Close project node."""
-        if not self.__ask_exit():
+        root = self.tree_main.currentItem()
+        if not self.__ask_exit([root]):
             return
 
-        root = self.tree_main.currentItem()
         self.__delete_node_data(root)
         self.tree_main.takeTopLevelItem(self.tree_main.indexOfTopLevelItem(root))
         self.text_editor.clear()
@@ -295,15 +330,19 @@ class MainWindow(MainWindowBase):
                 return
 
         for file_name in file_names:
+            file_name = project_of(file_name)
             self.env = QFileInfo(file_name).absolutePath()
             index = self.__in_widget(file_name)
             if index == -1:
                 root_node = QTreeRoot(QFileInfo(file_name).baseName(), file_name, '')
                 self.tree_main.addTopLevelItem(root_node)
-                self.refresh_proj(root_node)
+                # The journal is replayed after the project is loaded.
+                self.__reload_node(root_node)
+                self.__recover(root_node)
                 self.tree_main.setCurrentItem(root_node)
             else:
                 self.tree_main.setCurrentItem(self.tree_main.topLevelItem(index))
+        self.__add_macros()
 
     @Slot()
     def refresh_proj(self, node: Optional[QTreeWidgetItem] = None):
@@ -318,22 +357,57 @@ class MainWindow(MainWindowBase):
             )
             return
 
+        self.__discard_journal(node)
+        self.__reload_node(node)
+        self.__add_macros()
+
+    def __discard_journal(self, node: QTreeWidgetItem):
+        """Remove the journal records of the node and its sub-nodes."""
+        root = _get_root(node)
+        if root is node:
+            clear_journal(root.text(1))
+            return
+        keys = []
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            keys.append(journal_key(node, self.data))
+            nodes.extend(node.child(i) for i in range(node.childCount()))
+        discard_journal(root.text(1), keys)
+
+    def __reload_node(self, node: QTreeWidgetItem):
+        """Re-parse the node and its data."""
         self.__delete_node_data(node)
         node.takeChildren()
-        parse(node, self.data)
+        dlg = QProgressDialog(f"Loading {node.text(1)}", "", 0, 0, self)
+        dlg.setWindowTitle("Loading")
+        dlg.setCancelButton(None)
+        dlg.setWindowModality(Qt.WindowModal)
+        dlg.setMinimumDuration(500)
+
+        def progress(value: int, maximum: int):
+            """Show the loading progress."""
+            dlg.setMaximum(maximum)
+            dlg.setValue(value)
+
+        parse(
+            node,
+            self.data,
+            self.keeper,
+            progress,
+            self.lazy_loading_option.isChecked(),
+            self.project_cache_option.isChecked()
+        )
+        dlg.deleteLater()
         self.tree_main.setCurrentItem(node)
         _expand_recursive(node)
         code = int(node.text(2))
-        self.text_editor.setText(self.data[code])
+        mapped = self.data.mapped(code)
+        if mapped is None:
+            self.text_editor.setText(self.data[code])
+        else:
+            self.text_editor.set_mapped(mapped)
         self.data.set_saved(code, True)
-        self.__add_macros()
-
-        # File keeper
-        if self.keeper is not None:
-            self.keeper.stop()
-        self.keeper = FileKeeper(LOADED_FILES, self)
-        self.keeper.file_changed.connect(self.file_changed_warning)
-        self.keeper.start()
 
     @Slot()
     def open_path(self):
@@ -358,10 +432,12 @@ class MainWindow(MainWindowBase):
         )
         if node.isExpanded() and node.childCount():
             node.addChild(new_node)
+            set_root(new_node, self.data)
             return
         parent = node.parent()
         if parent is not None:
             parent.insertChild(parent.indexOfChild(node) + 1, new_node)
+            set_root(new_node, self.data)
             return
         self.tree_main.indexOfTopLevelItem(
             self.tree_main.indexOfTopLevelItem(node) + 1,
@@ -396,6 +472,7 @@ class MainWindow(MainWindowBase):
         self.data[code] = self.data[int(node.text(2))]
         node.setText(2, str(code))
         parent.insertChild(parent.indexOfChild(node_origin) + 1, node)
+        set_root(node, self.data)
 
     @Slot()
     def clone_node(self):
@@ -405,6 +482,7 @@ class MainWindow(MainWindowBase):
         node = node_origin.clone()
         node.takeChildren()
         parent.insertChild(parent.indexOfChild(node_origin) + 1, node)
+        set_root(node, self.data)
 
     @Slot()
     def copy_node_recursive(self):
@@ -424,13 +502,16 @@ class MainWindow(MainWindowBase):
         new_pointer(node_origin_copy)
         new_pointer = None
         parent.insertChild(parent.indexOfChild(node_origin) + 1, node_origin_copy)
+        set_root(node_origin_copy, self.data)
 
     @Slot()
     def clone_node_recursive(self):
         """Copy current node and its sub-nodes with same pointer."""
         node_origin = self.tree_main.currentItem()
         parent = node_origin.parent()
-        parent.insertChild(parent.indexOfChild(node_origin) + 1, node_origin.clone())
+        node = node_origin.clone()
+        parent.insertChild(parent.indexOfChild(node_origin) + 1, node)
+        set_root(node, self.data)
 
     @Slot()
     def save_proj(self, index: Optional[int] = None, *, for_all: bool = False):
@@ -449,17 +530,26 @@ class MainWindow(MainWindowBase):
         else:
             root = self.tree_main.topLevelItem(index)
         self.__save_current()
-        self.keeper.set_passed(True)
-        save_file(root, self.data)
-        self.keeper.set_passed(False)
-        self.data.save_all()
+        self.journal_timer.stop()
+        save_file(
+            root,
+            self.data,
+            self.keeper.learn,
+            self.sharded_project_option.isChecked(),
+            'zlib' if self.compress_data_option.isChecked() else None
+        )
+        clear_journal(root.text(1))
+        self.data.save_root(int(root.text(2)))
+        if self.data.is_all_saved():
+            self.set_saved_title()
 
     def __save_current(self):
         """Save the current text of editor."""
         self.text_editor.remove_trailing_blanks()
         item = self.tree_main.currentItem()
-        if item is not None:
-            self.data[int(item.text(2))] = self.text_editor.text()
+        if item is not None and self.__editor_modified():
+            self.data.replace(int(item.text(2)), self.text_editor.text())
+            self.text_editor.setModified(False)
         self.text_editor.spell_check_all()
 
     @Slot()
@@ -479,20 +569,28 @@ class MainWindow(MainWindowBase):
         parent.removeChild(node)
 
     def __delete_node_data(self, node: QTreeWidgetItem):
-        """Delete data from data structure."""
-        name = node.text(0)
-        if node in LOADED_FILES:
-            LOADED_FILES.remove(node)
-        if name.startswith('@'):
-            for action in self.macros_toolbar.actions():
-                if action.text() == name[1:]:
-                    self.macros_toolbar.removeAction(action)
-
-        if node.text(2):
-            self.data.pop(int(node.text(2)))
-
-        for i in range(node.childCount()):
-            self.__delete_node_data(node.child(i))
+        """Delete data of the node and its sub-nodes from data structure."""
+        paths = []
+        macros = set()
+        codes = []
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            path = self.keeper.path(node)
+            if path is not None:
+                paths.append(path)
+            name = node.text(0)
+            if name.startswith('@'):
+                macros.add(name[1:])
+            if node.text(2):
+                codes.append(int(node.text(2)))
+            nodes.extend(node.child(i) for i in range(node.childCount()))
+
+        self.keeper.remove_paths(paths)
+        for action in self.macros_toolbar.actions():
+            if action.text() in macros:
+                self.macros_toolbar.removeAction(action)
+        self.data.pop_many(codes)
 
     @Slot()
     def move_up_node(self):
@@ -571,6 +669,7 @@ class MainWindow(MainWindowBase):
                 return
             tree_main.takeTopLevelItem(index)
             tree_main.topLevelItem(index - 1).addChild(node)
+            set_root(node, self.data)
 
         tree_main.setCurrentItem(node)
         self.__root_unsaved()
@@ -677,8 +776,12 @@ class MainWindow(MainWindowBase):
 
         bar: QScrollBar = self.text_editor.verticalScrollBar()
         if previous:
+            if self.journal_timer.isActive():
+                self.journal_timer.stop()
+                self.__journal(previous)
             key = int(previous.text(2))
-            self.data[key] = self.text_editor.text()
+            if self.__editor_modified():
+                self.data.replace(key, self.text_editor.text())
             self.data.set_pos(key, bar.value())
         if current:
             # Auto highlight.
@@ -700,12 +803,67 @@ class MainWindow(MainWindowBase):
                             self.highlighter_option.setCurrentText(name_m)
                             break
             key = int(current.text(2))
-            self.text_editor.setText(self.data[key])
+            self.data.load(key)
+            mapped = self.data.mapped(key)
+            if mapped is None:
+                self.text_editor.setText(self.data[key])
+            else:
+                self.text_editor.set_mapped(mapped)
             bar.setValue(self.data.pos(key))
 
         self.reload_html_viewer()
         self.__action_changed()
 
+    def __editor_modified(self) -> bool:
+        """Return True if the editor text is changed since it was set or stored."""
+        return not self.text_editor.is_mapped() and self.text_editor.isModified()
+
+    @Slot()
+    def journal_current(self):
+        """Append the text of current node to the journal."""
+        node = self.tree_main.currentItem()
+        if node is not None:
+            self.__journal(node)
+
+    def __journal(self, node: QTreeWidgetItem):
+        """Append the editor text of the node to the journal of its project."""
+        if not self.edit_journal_option.isChecked() or self.text_editor.is_mapped():
+            return
+        append_journal(
+            _get_root(node).text(1),
+            journal_key(node, self.data),
+            self.text_editor.text()
+        )
+
+    def __recover(self, root: QTreeWidgetItem):
+        """Replay the journal of the project."""
+        if not self.edit_journal_option.isChecked():
+            return
+        records = read_journal(root.text(1))
+        if not records:
+            return
+        # Only the nodes of the project are recovered.
+        count = 0
+        nodes = [root]
+        while nodes and count < len(records):
+            node = nodes.pop()
+            code = int(node.text(2))
+            text = records.get(journal_key(node, self.data))
+            if text is not None:
+                self.data[code] = text
+                count += 1
+            # The lazy nodes are loaded until all the records are found.
+            self.data.load(code)
+            nodes.extend(node.child(i) for i in range(node.childCount()))
+        print(f"Recovered: {count} nodes of {root.text(1)}")
+
+    @Slot(QTreeWidgetItem, name='on_tree_main_itemExpanded')
+    def __load_node(self, node: QTreeWidgetItem):
+        """Load the lazy node when expanded."""
+        self.data.load(int(node.text(2)))
+        if not node.childCount():
+            node.setExpanded(False)
+
     @Slot(QTreeWidgetItem, int, name='on_tree_main_itemChanged')
     def __reload_nodes(self, node: QTreeWidgetItem, _: int):
         """Mark edited node as unsaved."""
@@ -844,12 +1002,19 @@ class MainWindow(MainWindowBase):
             if node.childCount():
                 last_name += '->'
             code = int(node.text(2))
-            doc = self.data[code]
+            self.data.load(code)
+            mapped = self.data.mapped(code)
+            if mapped is None:
+                index = LineIndex(self.data[code].encode('utf-8'))
+            else:
+                index = mapped.line_index()
             pattern = re.compile(text.encode('utf-8'), flags)
-            for m in pattern.finditer(doc.encode('utf-8')):
-                start, end = m.span()
+            offsets = [p for m in pattern.finditer(index.doc) for p in m.span()]
+            pairs = index.positions(offsets)
+            for i in range(0, len(pairs), 2):
+                (line1, index1), (line2, index2) = pairs[i], pairs[i + 1]
                 item = QListWidgetItem(last_name)
-                item.setToolTip(f"{code}:{start}:{end}")
+                item.setToolTip(f"{code}:{line1}:{index1}:{line2}:{index2}")
                 self.find_list_node[code] = node
                 self.find_list.addItem(item)
             for i in range(node.childCount()):
@@ -874,12 +1039,9 @@ class MainWindow(MainWindowBase):
         if item is None:
             return
 
-        tool_tips = item.toolTip().split(':')
-        code = int(tool_tips[0])
-        start = int(tool_tips[1])
-        end = int(tool_tips[2])
+        code, line1, index1, line2, index2 = (int(t) for t in item.toolTip().split(':'))
         self.tree_main.setCurrentItem(self.find_list_node[code])
-        self.text_editor.setSelection(start, end)
+        self.text_editor.setSelection(line1, index1, line2, index2)
 
     @Slot(name='on_replace_project_button_clicked')
     def __replace_project(self):
@@ -889,6 +1051,26 @@ class MainWindow(MainWindowBase):
         if count == 0:
             return
 
+        # The mapped files are read-only.
+        codes: Set[int] = set()
+        read_only: Set[int] = set()
+        for row in range(self.find_list.count()):
+            code = int(self.find_list.item(row).toolTip().split(':')[0])
+            if self.data.mapped(code) is not None:
+                read_only.add(code)
+                count -= 1
+            else:
+                codes.add(code)
+        if read_only:
+            QMessageBox.information(
+                self,
+                "Read-only files",
+                f"{len(read_only)} large files are opened as read-only, "
+                f"their matches will not be replaced."
+            )
+        if count == 0:
+            return
+
         if QMessageBox.question(
             self,
             "Replace in project",
@@ -907,13 +1089,10 @@ class MainWindow(MainWindowBase):
 
         text, replace_text, flags = self.__search_option()
 
-        used_code = set()
-        for row in range(self.find_list.count()):
-            code = int(self.find_list.item(row).toolTip().split(':')[0])
-            if code in used_code:
-                continue
-            self.data[code] = re.sub(text, replace_text, self.data[code], flags)
-            used_code.add(code)
+        for code in codes:
+            doc, count = re.subn(text, replace_text, self.data[code], flags=flags)
+            if count:
+                self.data.replace(code, doc)
 
         self.__root_unsaved()
 
@@ -941,13 +1120,46 @@ class MainWindow(MainWindowBase):
     def __hard_wrap(self, wrap: bool):
         self.text_editor.setWrapMode(QsciScintilla.WrapCharacter if wrap else QsciScintilla.WrapWord)
 
-    @Slot(str, QTreeWidgetItem)
-    def file_changed_warning(self, path: str, node: QTreeWidgetItem):
-        """Triggered when file changed."""
-        if QMessageBox.warning(
-            self,
+    @Slot(list)
+    def file_changed_warning(self, paths: Sequence[str]):
+        """Triggered when files changed.
+
+        The files are reloaded in one pass.
+        The nodes are found after the dialog is closed,
+        because they may be reloaded or removed during the dialog.
+        """
+        count = len(paths)
+        if count == 1:
+            text = f"File {paths[0]} has changed.\nReload the file?"
+        else:
+            text = f"{count} files changed.\nReload the files?"
+        dlg = QMessageBox(
+            QMessageBox.Warning,
             "File Changed",
-            f"File {path} has changed.\nReload the file?",
-            QMessageBox.Yes | QMessageBox.No
-        ) == QMessageBox.Yes:
-            self.refresh_proj(node)
+            text,
+            QMessageBox.Yes | QMessageBox.No,
+            self
+        )
+        if count > 1:
+            dlg.setDetailedText('\n'.join(paths))
+        if dlg.exec() != QMessageBox.Yes:
+            return
+
+        # The items are not hashable, keyed by their identities.
+        nodes = {id(node): node for node in (
+            self.keeper.node(path) for path in paths if self.keeper.has_path(path)
+        )}
+
+        def in_batch(node: QTreeWidgetItem) -> bool:
+            """Return True if its parent will be reloaded."""
+            parent = node.parent()
+            while parent is not None:
+                if id(parent) in nodes:
+                    return True
+                parent = parent.parent()
+            return False
+
+        for node in [node for node in nodes.values() if not in_batch(node)]:
+            self.__discard_journal(node)
+            self.__reload_node(node)
+        self.__add_macros()
@@ -8,6 +8,7 @@ __license__ = "AGPL"
 __email__ = "pyslvs@gmail.com"
 
 from typing import (
+    Sequence,
     Dict,
     Optional,
 )
@@ -18,6 +19,7 @@ from core.QtModules import (
     QABCMeta,
     QMainWindow,
     QSettings,
+    QTimer,
     QShortcut,
     QKeySequence,
     QPoint,
@@ -28,13 +30,20 @@ from core.QtModules import (
     QMenu,
     QWebEngineView,
     QSCI_HIGHLIGHTERS,
+    QSCINTILLA_VERSION_STR,
 )
 from core.text_editor import TextEditor
-from core.info import INFO, ARGUMENTS
+from core.info import INFO as CORE_INFO, ARGUMENTS
 from core.data_structure import DataDict
+from core.file_keeper import FileKeeper
 from .logging_handler import XStream
 from .Ui_main_window import Ui_MainWindow
 
+# Idle time before the edited text is appended to the journal. (ms)
+_JOURNAL_INTERVAL = 1000
+# The module information with the GUI libraries.
+INFO = CORE_INFO + ("QScintilla Version: {}".format(QSCINTILLA_VERSION_STR),)
+
 
 class MainWindowBase(QMainWindow, Ui_MainWindow, metaclass=QABCMeta):
 
@@ -69,6 +78,13 @@ class MainWindowBase(QMainWindow, Ui_MainWindow, metaclass=QABCMeta):
         self.edge_line_option.toggled.connect(self.text_editor.setEdgeMode)
         self.trailing_blanks_option.toggled.connect(self.text_editor.set_remove_trailing_blanks)
 
+        # Edit journal
+        self.journal_timer = QTimer(self)
+        self.journal_timer.setSingleShot(True)
+        self.journal_timer.setInterval(_JOURNAL_INTERVAL)
+        self.journal_timer.timeout.connect(self.journal_current)
+        self.text_editor.word_changed.connect(self.journal_timer.start)
+
         # Highlighters
         self.highlighter_option.addItems(sorted(QSCI_HIGHLIGHTERS))
         self.highlighter_option.setCurrentText("Markdown")
@@ -172,10 +188,11 @@ class MainWindowBase(QMainWindow, Ui_MainWindow, metaclass=QABCMeta):
         self.macros_toolbar.setToolButtonStyle(Qt.ToolButtonTextBesideIcon)
 
         # File keeper
-        self.keeper = None
+        self.keeper = FileKeeper(self)
+        self.keeper.files_changed.connect(self.file_changed_warning)
 
         # Data
-        self.data = DataDict()
+        self.data = DataDict(ARGUMENTS.memory_budget * 1024 * 1024)
         self.data.not_saved.connect(self.set_not_saved_title)
         self.data.all_saved.connect(self.set_saved_title)
         self.env = QStandardPaths.writableLocation(QStandardPaths.DesktopLocation)
@@ -263,3 +280,11 @@ class MainWindowBase(QMainWindow, Ui_MainWindow, metaclass=QABCMeta):
     @abstractmethod
     def start_finder(self):
         ...
+
+    @abstractmethod
+    def file_changed_warning(self, paths: Sequence[str]) -> None:
+        ...
+
+    @abstractmethod
+    def journal_current(self) -> None:
+        ...
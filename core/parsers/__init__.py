@@ -12,44 +12,92 @@ from typing import (
     List,
     Dict,
     Union,
+    Callable,
+    Optional,
+    Any,
 )
+from os import replace
+from os.path import getsize
+from collections import Counter
+import re
+from mmap import mmap, ACCESS_READ
+import zlib
+import lzma
+from concurrent.futures import ThreadPoolExecutor, Future
 import yaml
 from yaml.representer import SafeRepresenter
-from core.QtModules import (
-    QTreeWidgetItem,
-    QTreeItem,
-    QFileInfo,
-    QDir,
-    QIcon,
-    QPixmap,
-)
-from core.data_structure import DataDict
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+from core.QtCoreModules import QFileInfo, QDir
+from core.data_structure import DataDict, MappedText
+from core.file_keeper import FileKeeper, content_hash
 from core.info import __version__
+from .node import TreeItem, Node, new_item
 from .misc import (
     file_suffix,
     node_getpath,
     getpath,
 )
-from .text import parse_text
+from .text import FileInfo, read_text, encode
+from .cache import (
+    Fingerprint,
+    CachedFiles,
+    fingerprint,
+    load_cache,
+    save_cache,
+)
+from .shards import (
+    is_sharded,
+    project_of,
+    index_path,
+    blob_path,
+    read_blobs,
+    write_blob,
+    remove_blobs,
+)
+from .journal import (
+    journal_key,
+    append_journal,
+    read_journal,
+    discard_journal,
+    clear_journal,
+)
 from .markdown import (
     PandocTransformThread,
-    parse_markdown,
+    Section,
+    read_markdown,
+    build_markdown,
 )
 
 __all__ = [
     'getpath',
+    'project_of',
+    'journal_key',
+    'append_journal',
+    'read_journal',
+    'discard_journal',
+    'clear_journal',
     'parse',
+    'set_root',
     'save_file',
     'file_suffix',
-    'file_icon',
     'PandocTransformThread',
     'SUPPORT_FILE_FORMATS',
-    'LOADED_FILES',
 ]
 
 
 NodeDict = Dict[str, Union[int, str, List['NodeDict']]]
 YMLData = Dict[str, Union[int, List[NodeDict], Dict[int, str]]]
+# Callback with the path and the content hash of the saved file.
+SavedHook = Optional[Callable[[str, bytes], None]]
+# Callback with the number of loaded files and the total number.
+ProgressHook = Optional[Callable[[int, int], None]]
+# Result of the file reader.
+FileContent = Union[str, MappedText, Tuple[str, List[Section]], None]
+# (content, file information)
+FileData = Tuple[FileContent, Optional[FileInfo]]
 
 _SUPPORTED_FILE_SUFFIX: Dict[str, str] = {
     'kmol': "Kmol Project",
@@ -67,14 +115,29 @@ SUPPORT_FILE_FORMATS = ';;'.join(
     for name, suffix_text in _SUPPORTED_FILE_SUFFIX.items()
 )
 _SUPPORTED_FILE_SUFFIX.pop("")
-
-# Global file list
-LOADED_FILES: List[QTreeWidgetItem] = []
+# Disable the line folding of YAML dumper.
+_MAX_WIDTH = 2 ** 31 - 1
+# Buffer size of the project writer.
+_BUFFER_SIZE = 1 << 20
+# Revision of project format, the data blocks are indexed since revision 2.
+_FORMAT = 2
+# Compression methods of data blocks.
+_CODECS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+# The smaller data blocks are not compressed.
+_COMPRESS_SIZE = 256
+# The smaller data blocks are not shared.
+_SHARE_SIZE = 64
+# Key and anchor in front of a data block.
+_ENTRY_PREFIX = re.compile(rb" *(-?\d+): (?:&k(-?\d+) )?")
 
 
 def _str_style(style, representer):
     def new_representer(dumper, data):
-        scalar = representer(dumper, data)
+        # C emitter only accepts the exact string type.
+        scalar = representer(dumper, str(data))
         scalar.style = style
         return scalar
     return new_representer
@@ -84,28 +147,258 @@ class _LiteralDoc(str):
     pass
 
 
-yaml.add_representer(_LiteralDoc, _str_style('|', SafeRepresenter.represent_str))
+yaml.add_representer(_LiteralDoc, _str_style('|', SafeRepresenter.represent_str), Dumper=_Dumper)
 
 
-def file_icon(file_type: str) -> QIcon:
-    """Return icon by file format."""
-    return QIcon(QPixmap(f":/icons/{file_type}.png"))
+def _yaml_dump(yml_data: YMLData, flow: Optional[bool] = False) -> str:
+    """Dump YAML data as same as the pure Python dumper.
 
+    The long scalars are not folded, since the C emitter folds
+    the escaped characters at the different column.
+    The C emitter also ends the stream with a document end marker
+    after the "|+" scalars, which is not needed.
+    """
+    doc = yaml.dump(yml_data, Dumper=_Dumper, default_flow_style=flow, width=_MAX_WIDTH)
+    if doc.endswith("\n...\n"):
+        doc = doc[:-len("...\n")]
+    return doc
 
-def _write_tree(proj_name: str, root_node: QTreeWidgetItem, data: DataDict):
-    """Write to YAML file."""
-    yml_data: YMLData = {}
+
+def _load_yaml(file_name: str) -> YMLData:
+    """Load the whole YAML file."""
+    with open(file_name, encoding='utf-8') as f:
+        return yaml.load(f.read(), Loader=_Loader)
+
+
+def _load_tail(proj_name: str) -> Optional[YMLData]:
+    """Load the sections after the data blocks of project.
+
+    Return None if the project is not indexed,
+    or the data blocks are changed without the index.
+    """
+    with open(proj_name, 'rb') as f:
+        if not f.seek(0, 2):
+            return None
+        with mmap(f.fileno(), 0, access=ACCESS_READ) as m:
+            # The data blocks are indented, so it must be the description.
+            pos = m.rfind(b"\ndescription: ")
+            if pos == -1:
+                return None
+            tail = m[pos + 1:]
+    try:
+        yml_data = yaml.load(tail.decode('utf-8'), Loader=_Loader)
+    except (UnicodeError, yaml.YAMLError):
+        return None
+    if not isinstance(yml_data, dict) or yml_data.get('format', 1) < _FORMAT:
+        return None
+    if yml_data.get('data_end', pos + 1) != pos + 1:
+        return None
+    return yml_data
+
+
+class _DataSource:
+
+    """The project file of the indexed data blocks.
+
+    If a block can not be trusted, the whole project is loaded once,
+    and all the unloaded blocks of the project are loaded from it.
+    The blocks of the whole loaded project can be provided directly.
+    """
+
+    def __init__(
+        self,
+        proj_name: str,
+        proj_fingerprint: Optional[Fingerprint],
+        blocks: Optional[Dict[int, Any]] = None
+    ):
+        self.proj_name = proj_name
+        self.proj_fingerprint = proj_fingerprint
+        self.entries: List['_DataEntry'] = []
+        self.blocks = blocks
+
+    def is_changed(self) -> bool:
+        """Return True if the project has been changed."""
+        return fingerprint(self.proj_name) != self.proj_fingerprint
+
+    def reload(self, data: DataDict, entry: '_DataEntry'):
+        """Load the entry and the unloaded blocks from the whole project.
+
+        The blocks are marked as unsaved if the project has been changed,
+        since they are not the version of the tree.
+        """
+        changed = self.is_changed()
+        try:
+            self.blocks = _load_yaml(self.proj_name).get('data', {})
+        except (OSError, UnicodeError, yaml.YAMLError) as e:
+            print(f"Load Error: {e}")
+            self.blocks = {}
+        if changed:
+            print(f"Changed on disk: {self.proj_name}")
+        entries = [entry] + [other for other in self.entries if other is not entry]
+        self.entries = []
+        try:
+            for other in entries:
+                if other is entry:
+                    entry()
+                elif data.loader(other.code) is other:
+                    data.load(other.code)
+                else:
+                    continue
+                if changed:
+                    data.set_saved(other.code, False)
+        finally:
+            self.blocks = None
+
+
+class _DataEntry:
+
+    """Loader of the indexed data block in the project file.
+
+    The compressed blocks are stored as binary scalars.
+    The identical blocks are stored once with an anchor,
+    and the index of its aliases point to the same block.
+    """
+
+    def __init__(
+        self,
+        source: _DataSource,
+        code: int,
+        data: DataDict,
+        offset: int,
+        length: int,
+        codec: Optional[str] = None
+    ):
+        self.source = source
+        self.code = code
+        self.data = data
+        self.offset = offset
+        self.length = length
+        self.codec = codec
+        source.entries.append(self)
+
+    @property
+    def proj_name(self) -> str:
+        """Return the project file name."""
+        return self.source.proj_name
+
+    @property
+    def key(self) -> int:
+        """Return the key of the block in the project file."""
+        return self.data.origin(self.code)
+
+    def block(self) -> Tuple[str, int]:
+        """Return the position of data block, the aliases have the same position."""
+        return self.proj_name, self.offset
+
+    def index(self) -> List[Union[int, str]]:
+        """Return the index entry of data block."""
+        index: List[Union[int, str]] = [self.offset, self.length]
+        if self.codec:
+            index.append(self.codec)
+        return index
+
+    def raw(self) -> Optional[bytes]:
+        """Return the bytes of data block.
+
+        Return None if the project has been changed,
+        or the index does not point to the whole block of the code.
+        """
+        if self.offset < 1 or self.source.is_changed():
+            return None
+        try:
+            with open(self.proj_name, 'rb') as f:
+                # Read the line boundaries around the block.
+                f.seek(self.offset - 1)
+                doc = f.read(self.length + 4)
+        except OSError:
+            return None
+        block = doc[1:self.length + 1]
+        if (
+            len(block) != self.length
+            or doc[:1] != b"\n"
+            or not block.endswith(b"\n")
+            or doc[self.length + 1:].startswith(b"   ")
+        ):
+            return None
+        m = _ENTRY_PREFIX.match(block)
+        if m is None or m.start(1) != 2:
+            return None
+        if int(m.group(1)) != self.key and m.group(2) is None:
+            # Only the shared block has different code.
+            return None
+        return block
+
+    def __call__(self):
+        """Load the data block."""
+        blocks = self.source.blocks
+        if blocks is None:
+            doc = self.raw()
+            if doc is None:
+                # Changed by other programs or the index is out of date.
+                self.source.reload(self.data, self)
+                return
+        try:
+            if blocks is None:
+                # The block is an indented mapping, it may be shared by other nodes.
+                text, = yaml.load(doc.decode('utf-8'), Loader=_Loader).values()
+            elif self.key in blocks:
+                text = blocks[self.key]
+            else:
+                raise KeyError(f"{self.key} is not in {self.proj_name}")
+            if self.codec:
+                text = _CODECS[self.codec][1](text).decode('utf-8')
+        except (
+            KeyError,
+            ValueError,
+            UnicodeError,
+            yaml.YAMLError,
+            zlib.error,
+            lzma.LZMAError,
+        ) as e:
+            print(f"Load Error: {e}")
+            # The placeholder is not the saved text.
+            self.data.set_saved(self.code, False)
+            return
+        self.data[self.code] = text
+        if blocks is None:
+            # Read from the checked position.
+            self.data.set_block(self.code, self.block())
+
+
+def _write_tree(
+    proj_name: str,
+    root_node: TreeItem,
+    data: DataDict,
+    on_saved: SavedHook = None,
+    sharded: bool = False,
+    compression: Optional[str] = None
+):
+    """Write to YAML file.
+
+    The nodes and data are written incrementally,
+    so the whole document is never built in memory.
+    The existing project keeps its layout,
+    otherwise the new project is written in sharded layout if "sharded" is True.
+    The changed data blocks are compressed by "compression" method if provided.
+    """
     my_codes: List[int] = []
+    # The codes are written as their own keys, except the sub-projects.
+    node_codes: List[int] = []
 
-    def add_node(node: QTreeWidgetItem) -> NodeDict:
+    def add_node(node: TreeItem) -> NodeDict:
         code_int = int(node.text(2))
+        if file_suffix(node.text(1)) != 'kmol':
+            node_codes.append(code_int)
         node_dict: NodeDict = {
             'code': code_int,
             'name': node.text(0),
             'path': node.text(1),
             'sub': [],
         }
-        if file_suffix(node.text(1)) not in _SUPPORTED_FILE_SUFFIX:
+        if (
+            file_suffix(node.text(1)) not in _SUPPORTED_FILE_SUFFIX
+            and data.mapped(code_int) is None
+        ):
             my_codes.append(code_int)
         if QFileInfo(QDir(node_getpath(node.parent())).filePath(node.text(1))).isFile():
             # Files do not need to make a copy.
@@ -115,56 +408,203 @@ def _write_tree(proj_name: str, root_node: QTreeWidgetItem, data: DataDict):
         return node_dict
 
     root_code = int(root_node.text(2))
-    yml_data['description'] = root_code
-
-    yml_data['node'] = []
+    node_list: List[NodeDict] = []
     for i in range(root_node.childCount()):
-        yml_data['node'].append(add_node(root_node.child(i)))
-
-    yml_data['data'] = {root_code: _LiteralDoc(data[root_code]) or ''}
-    for code in my_codes:
-        yml_data['data'][code] = _LiteralDoc(data[code]) or ''
-
-    data.save_all()
-
-    yml_str = (
-        f"# Generated by Kmol editor {__version__}\n\n" +
-        yaml.dump(yml_data, default_flow_style=False)
-    )
-    with open(proj_name, 'w', encoding='utf-8') as f:
-        f.write(yml_str)
+        node_list.append(add_node(root_node.child(i)))
+
+    codes = sorted({root_code, *my_codes})
+    if not QFileInfo(proj_name).isFile() and (sharded or is_sharded(proj_name)):
+        # Only write the changed data.
+        for code in codes:
+            if not data.is_saved(code) or not QFileInfo(blob_path(proj_name, code)).isFile():
+                write_blob(proj_name, code, encode(data[code]))
+        remove_blobs(proj_name, codes)
+        file_name = index_path(proj_name)
+        data.save_keys(codes)
+        codes = []
+    else:
+        file_name = proj_name
+        data.save_keys(codes)
+
+    # The identical blocks are written once.
+    # The unloaded blocks and the unchanged loaded blocks are keyed by their positions.
+    block_keys: Dict[int, Any] = {}
+    for code in codes:
+        loader = data.loader(code)
+        if isinstance(loader, _DataEntry):
+            block_keys[code] = loader.block()
+        elif data.block(code) is not None:
+            block_keys[code] = data.block(code)
+        elif len(data[code]) >= _SHARE_SIZE:
+            block_keys[code] = data[code]
+    block_counts = Counter(block_keys.values())
+    anchors: Dict[Any, int] = {}
+
+    # The sections are written in the sorted order of YAML dumper.
+    # The unloaded blocks are copied from the old file, so write to a temporary file first.
+    hasher = content_hash()
+    index: Dict[int, List[Union[int, str]]] = {}
+    unloaded: List[int] = []
+    tmp_name = file_name + '.tmp'
+    with open(tmp_name, 'wb', buffering=_BUFFER_SIZE) as f:
+        def write(doc: Union[str, bytes]):
+            if isinstance(doc, str):
+                doc = encode(doc)
+            f.write(doc)
+            hasher.update(doc)
+
+        write(f"# Generated by Kmol editor {__version__}\n\n")
+        if codes:
+            write("data:\n")
+        for code in codes:
+            loader = data.loader(code)
+            if isinstance(loader, _DataEntry):
+                unloaded.append(code)
+            block_key = block_keys.get(code)
+            if block_key in anchors:
+                # Alias of the written block.
+                index[code] = list(index[anchors[block_key]])
+                write(f"  {code}: *k{anchors[block_key]}\n")
+                continue
+            prefix = f"  {code}: "
+            if block_key is not None and block_counts[block_key] > 1:
+                anchors[block_key] = code
+                prefix += f"&k{code} "
+            body = loader.raw() if isinstance(loader, _DataEntry) else None
+            if body is None:
+                # Only one node text is rendered at a time.
+                text = data[code]
+                if compression and len(text) >= _COMPRESS_SIZE:
+                    value = _CODECS[compression][0](text.encode('utf-8'))
+                    index[code] = [f.tell(), 0, compression]
+                else:
+                    value = _LiteralDoc(text) or ''
+                    index[code] = [f.tell(), 0]
+                body = _yaml_dump({'data': {code: value}})
+                body = encode(body[len(f"data:\n  {code}: "):])
+            else:
+                # The compression of unloaded blocks are kept.
+                index[code] = loader.index()
+                index[code][0] = f.tell()
+                body = body[_ENTRY_PREFIX.match(body).end():]
+            entry = encode(prefix) + body
+            index[code][1] = len(entry)
+            write(entry)
+        data_end = f.tell()
+        write(_yaml_dump({'description': root_code}))
+        write(_yaml_dump({'format': _FORMAT}))
+        if index:
+            # The end of data blocks, used to check the index is up to date.
+            write(_yaml_dump({'data_end': data_end}))
+            write(_yaml_dump({'index': index}, flow=None))
+        write(_yaml_dump({'node': node_list}))
+    replace(tmp_name, file_name)
+    if on_saved is not None and file_name == proj_name:
+        on_saved(getpath(root_node), hasher.digest())
+
+    for code in (root_code, *node_codes):
+        data.set_origin(code, code)
+    # Move the unloaded blocks to the new file.
+    source = _DataSource(proj_name, fingerprint(proj_name))
+    for code in unloaded:
+        data.set_loader(code, _DataEntry(source, code, data, *index[code]))
+    for code in index:
+        data.set_block(code, (proj_name, index[code][0]))
 
     print("Saved: {}".format(proj_name))
 
 
-def _parse_tree(root_node: QTreeWidgetItem, data: DataDict):
-    """Parse in to tree widget."""
-    try:
-        with open(root_node.text(1), encoding='utf-8') as f:
-            yaml_script = f.read()
-    except FileNotFoundError:
-        return
-
-    yml_data: YMLData = yaml.load(yaml_script, Loader=yaml.FullLoader)
-    parse_list: List[QTreeWidgetItem] = []
-
-    root_node.setText(2, str(yml_data['description']))
-    data.update(yml_data['data'])
+def _parse_tree(
+    root_node: TreeItem,
+    data: DataDict,
+    keeper: Optional[FileKeeper] = None,
+    progress: ProgressHook = None,
+    lazy: bool = False,
+    cache: bool = False
+):
+    """Parse in to tree widget.
+
+    The files are read by a thread pool,
+    and their nodes are built in the order of tree when the results come back.
+    If "lazy" is True, the files are loaded when their data are needed.
+    If "cache" is True, the unchanged project and files are loaded
+    from the cache file.
+    The indexed data blocks are loaded when their data are needed.
+    """
+    proj_name = root_node.text(1)
+    sharded = is_sharded(proj_name)
+    proj_fingerprint = fingerprint(proj_name)
+    if cache:
+        yml_data, cached_files = load_cache(proj_name)
+    else:
+        yml_data, cached_files = None, {}
+    if sharded:
+        # The data files can be changed without the index file.
+        yml_data = None
+    new_files: CachedFiles = {}
+
+    blocks = None
+    if yml_data is None:
+        try:
+            if sharded:
+                yml_data = _load_yaml(index_path(proj_name))
+                yml_data['data'] = read_blobs(proj_name)
+            else:
+                yml_data = _load_tail(proj_name)
+                if yml_data is None:
+                    # The old format without index is loaded entirely.
+                    yml_data = _load_yaml(proj_name)
+                    blocks = yml_data.get('data')
+        except FileNotFoundError:
+            return
+    parse_list: List[TreeItem] = []
+    index: Dict[int, List[Union[int, str]]] = yml_data.get('index', {})
+    yml_codes: Dict[int, str] = yml_data.get('data', {})
+
+    # All codes are claimed before the files are read,
+    # and the codes used by other projects are renumbered.
+    codes = {yml_data['description'], *index, *yml_codes}
+    node_dicts: List[NodeDict] = list(yml_data['node'])
+    while node_dicts:
+        node_dict = node_dicts.pop()
+        codes.add(node_dict['code'])
+        node_dicts.extend(node_dict['sub'])
+    own_code = int(root_node.text(2)) if root_node.text(2) else None
+    conflicts = sorted(code for code in codes if code in data and code != own_code)
+    for code in codes:
+        if code not in data:
+            data[code] = ""
+    renumber = dict(zip(conflicts, data.reserve(len(conflicts))))
+    if renumber:
+        print(f"Renumbered: {len(renumber)} nodes of {proj_name}")
+
+    root_node.setText(2, str(renumber.get(yml_data['description'], yml_data['description'])))
+    for code, new_code in renumber.items():
+        data.set_origin(new_code, code)
+    if index:
+        source = _DataSource(proj_name, proj_fingerprint, blocks)
+        for code, entry in index.items():
+            code = renumber.get(code, code)
+            data.set_loader(code, _DataEntry(source, code, data, *entry))
+    else:
+        for code, doc in yml_codes.items():
+            data[renumber.get(code, code)] = doc
+    data_codes = [renumber.get(code, code) for code in yml_codes]
 
-    def add_node(node_dict: NodeDict) -> QTreeWidgetItem:
+    def add_node(node_dict: NodeDict) -> TreeItem:
         """Add node in to tree widget."""
         name: str = node_dict['name']
-        code_int: int = node_dict['code']
+        code_int: int = renumber.get(node_dict['code'], node_dict['code'])
         path: str = node_dict['path']
-        node = QTreeItem(name, path, str(code_int))
+        node = new_item(root_node, name, path, str(code_int))
         if name.startswith('@'):
-            node.setIcon(0, file_icon("python"))
+            _icon(node, "python")
             data.add_macro(name[1:], code_int)
         suffix_text = file_suffix(path)
         if suffix_text:
             parse_list.append(node)
         elif path:
-            node.setIcon(0, file_icon("directory"))
+            _icon(node, "directory")
         subs: List[NodeDict] = node_dict['sub']
         for sub in subs:
             node.addChild(add_node(sub))
@@ -174,33 +614,135 @@ def _parse_tree(root_node: QTreeWidgetItem, data: DataDict):
     for child_node_dict in child_node_dicts:
         root_node.addChild(add_node(child_node_dict))
 
-    for node_item in parse_list:
-        parse(node_item, data)
-
-    data.save_all()
-
+    if lazy:
+        for node_item in parse_list:
+            _placeholder(node_item, data, keeper)
+        data.save_keys(_tree_codes(root_node))
+        data.save_keys(data_codes)
+        if cache:
+            save_cache(proj_name, proj_fingerprint, yml_data, cached_files)
+        return
 
-def save_file(node: QTreeWidgetItem, data: DataDict) -> Tuple[str, bool]:
-    """Recursive to all the contents of nodes."""
-    text_data = []
-    all_saved = data.is_saved(int(node.text(2)))
+    with ThreadPoolExecutor() as executor:
+        futures: Dict[Future, Tuple[TreeItem, str, int, str, Fingerprint]] = {}
+        for node_item in parse_list:
+            file_name, suffix_text, code = _prepare(node_item, data, keeper)
+            if suffix_text == 'kmol':
+                # Sub-project.
+                _parse_tree(node_item, data, keeper, progress, lazy, cache)
+                print("Loaded: {}".format(node_item.text(1)))
+                continue
+            file_fingerprint = fingerprint(file_name)
+            if file_fingerprint is not None and file_name in cached_files:
+                cached_fingerprint, content = cached_files[file_name]
+                if cached_fingerprint == file_fingerprint:
+                    _build(
+                        node_item,
+                        suffix_text,
+                        code,
+                        data,
+                        lambda: content,
+                        file_name,
+                        file_fingerprint,
+                        keeper
+                    )
+                    new_files[file_name] = (file_fingerprint, content)
+                    continue
+            future = executor.submit(_read, file_name, suffix_text)
+            futures[future] = (node_item, suffix_text, code, file_name, file_fingerprint)
+
+        total = len(futures)
+        # Built in the order of tree, so the sub-nodes are numbered as same as last time.
+        for i, future in enumerate(futures, start=1):
+            node_item, suffix_text, code, file_name, file_fingerprint = futures[future]
+            _build(
+                node_item,
+                suffix_text,
+                code,
+                data,
+                future.result,
+                file_name,
+                file_fingerprint,
+                keeper
+            )
+            print("Loaded: {}".format(node_item.text(1)))
+            if progress is not None:
+                progress(i, total)
+            if (
+                cache
+                and file_fingerprint is not None
+                and future.exception() is None
+                and not isinstance(future.result()[0], MappedText)
+            ):
+                new_files[file_name] = (file_fingerprint, future.result())
+
+    data.save_keys(_tree_codes(root_node))
+    data.save_keys(data_codes)
+    if cache and proj_fingerprint is not None:
+        save_cache(proj_name, proj_fingerprint, yml_data, new_files)
+
+
+def _is_same_file(file_name: str, doc: bytes) -> bool:
+    """Return True if the file content is same as the document."""
+    try:
+        if getsize(file_name) != len(doc):
+            return False
+        with open(file_name, 'rb') as f:
+            return f.read() == doc
+    except OSError:
+        return False
+
+
+def save_file(
+    node: TreeItem,
+    data: DataDict,
+    on_saved: SavedHook = None,
+    sharded: bool = False,
+    compression: Optional[str] = None,
+    tangle: bool = False
+) -> Tuple[str, bool]:
+    """Recursive to all the contents of nodes.
+
+    The content hash of each written file will pass to "on_saved" function.
+    The unloaded nodes are only loaded if their content is needed.
+    If "sharded" is True, the new projects are saved in sharded layout.
+    The "compression" method ('zlib' or 'lzma') is used by the project data.
+    If "tangle" is True, all the files are written but the projects are not.
+    """
+    code = int(node.text(2))
+    data.load(code)
+    text_data: List[Union[str, TreeItem]] = []
+    all_saved = data.is_saved(code)
     for i in range(node.childCount()):
-        doc, saved = save_file(node.child(i), data)
+        child = node.child(i)
+        child_code = int(child.text(2))
+        if (
+            (not data.is_loaded(child_code) and not child.childCount())
+            or data.mapped(child_code) is not None
+        ):
+            # Unloaded nodes and mapped files are not changed.
+            text_data.append(child)
+            continue
+        doc, saved = save_file(child, data, on_saved, sharded, compression, tangle)
         text_data.append(doc)
         all_saved &= saved
-    my_content = data[int(node.text(2))].splitlines()
+    my_content = data[code].splitlines()
     for i in range(len(my_content)):
         content_text = my_content[i]
         if content_text.endswith("@others"):
+            for j, t in enumerate(text_data):
+                if not isinstance(t, str):
+                    text_data[j] = save_file(t, data, on_saved, sharded, compression, tangle)[0]
             preffix = content_text[:-len("@others")]
             my_content[i] = '\n\n'.join(preffix + t for t in text_data)
     my_content = '\n'.join(my_content)
     path_text = QFileInfo(node.text(1)).fileName()
-    if path_text and not all_saved:
+    if path_text and (tangle or not all_saved):
         suffix_text = QFileInfo(path_text).suffix()
         if suffix_text == 'kmol':
             # Save project.
-            _write_tree(node.text(1), node, data)
+            if not tangle:
+                _write_tree(node.text(1), node, data, on_saved, sharded, compression)
         else:
             # File path.
             file_path = QDir(QFileInfo(node_getpath(node)).absolutePath())
@@ -208,55 +750,193 @@ def save_file(node: QTreeWidgetItem, data: DataDict) -> Tuple[str, bool]:
                 file_path.mkpath('.')
                 print("Create Folder: {}".format(file_path.absolutePath()))
             file_name = file_path.filePath(path_text)
+            if tangle and not QFileInfo(file_name).isFile():
+                # The data is the error message of reading.
+                raise FileNotFoundError(f"No such file: '{file_name}'")
 
             if suffix_text in _SUPPORTED_FILE_SUFFIX:
                 # Add end new line.
                 if my_content and (my_content[-1] != '\n'):
                     my_content += '\n'
+                encoding, newline = data.file_format(code)
                 try:
-                    with open(file_name, 'w', encoding='utf-8') as f:
-                        f.write(my_content)
+                    doc = encode(my_content, encoding, newline)
                 except UnicodeError:
-                    print(f"Unicode Error in: {file_name}")
+                    print(f"Unicode Error in: {file_name} ({encoding})")
                 else:
-                    print(f"Saved: {file_name}")
+                    if _is_same_file(file_name, doc):
+                        # Keep the modified time for the build tools.
+                        print(f"Unchanged: {file_name}")
+                    else:
+                        with open(file_name, 'wb') as f:
+                            f.write(doc)
+                        if on_saved is not None:
+                            on_saved(getpath(node), content_hash(doc).digest())
+                        print(f"Saved: {file_name}")
             elif suffix_text:
                 print(f"Ignore file: {file_name}")
 
     return my_content, all_saved
 
 
-def parse(node: QTreeWidgetItem, data: DataDict):
-    """Parse file to tree format."""
+def _prepare(
+    node: TreeItem,
+    data: DataDict,
+    keeper: Optional[FileKeeper]
+) -> Tuple[str, str, int]:
+    """Prepare the node before reading its file.
+
+    Return the file name, suffix and the code of the node.
+    """
     node.takeChildren()
     file_name = getpath(node)
     suffix_text = file_suffix(file_name)
     if node.text(2):
         code = int(node.text(2))
+        if code not in data:
+            # Claim the code before the sub-nodes are numbered.
+            data[code] = ""
     else:
         code = data.new_num()
         node.setText(2, str(code))
-    if node not in LOADED_FILES and suffix_text in _SUPPORTED_FILE_SUFFIX:
-        LOADED_FILES.append(node)
-
+    if keeper is not None and suffix_text in _SUPPORTED_FILE_SUFFIX:
+        keeper.add_paths({file_name: node})
+    if not isinstance(node, Node):
+        from .widget import set_icon, set_indicator
+        set_icon(node, suffix_text)
+        set_indicator(node, False)
+    return file_name, suffix_text, code
+
+
+def _icon(node: TreeItem, file_type: str):
+    """Set the icon of the node, the nodes without widget are skipped."""
+    if not isinstance(node, Node):
+        from .widget import file_icon
+        node.setIcon(0, file_icon(file_type))
+
+
+def _placeholder(
+    node: TreeItem,
+    data: DataDict,
+    keeper: Optional[FileKeeper]
+):
+    """Let the file node be parsed when its data is needed."""
+    suffix_text = file_suffix(node.text(1))
+    loader = lambda: parse(node, data, keeper, lazy=True)
+    if not isinstance(node, Node):
+        from .widget import set_icon, set_indicator, silent_loader
+        set_icon(node, suffix_text)
+        # May have sub-nodes.
+        set_indicator(node, suffix_text in {'md', 'kmol'})
+        loader = silent_loader(node, loader)
+    data.set_loader(int(node.text(2)), loader)
+
+
+def _read(file_name: str, suffix_text: str) -> FileData:
+    """Read the file. This function is thread safe."""
+    if suffix_text == 'md':
+        return read_markdown(file_name)
+    else:
+        return read_text(file_name)
+
+
+def _build(
+    node: TreeItem,
+    suffix_text: str,
+    code: int,
+    data: DataDict,
+    content: Callable[[], FileData],
+    file_name: str = "",
+    file_fingerprint: Optional[Fingerprint] = None,
+    keeper: Optional[FileKeeper] = None
+):
+    """Store the file content to the node. Must be called on GUI thread.
+
+    The "content" function returns the result of "_read" function.
+    The text files with fingerprint can be evicted from the data.
+    The content hash is recorded by the file keeper with the fingerprint
+    that taken before reading.
+    The encoding and newline of the file are used when writing it back.
+    """
+    try:
+        result, info = content()
+    except FileNotFoundError as e:
+        if suffix_text != 'md' or not data[code]:
+            data[code] = str(e)
+        return
+    if info is not None:
+        digest, encoding, newline = info
+        data.set_file_format(code, encoding, newline)
+        if keeper is not None and file_fingerprint is not None:
+            keeper.learn(file_name, digest, file_fingerprint)
     if suffix_text == 'md':
         # Markdown
-        node.setIcon(0, file_icon("markdown"))
-        parse_markdown(file_name, node, code, data)
-    elif suffix_text == 'py':
-        # Python script
-        node.setIcon(0, file_icon("python"))
-        parse_text(file_name, code, data)
-    elif suffix_text == 'html':
-        # TODO: Need to parse HTML (reveal.js index.html)
-        node.setIcon(0, file_icon("html"))
-        parse_text(file_name, code, data)
-    elif suffix_text == 'kmol':
-        # Kmol project
-        node.setIcon(0, file_icon("kmol"))
-        _parse_tree(node, data)
+        if result is not None:
+            head, sections = result
+            build_markdown(head, sections, node, code, data)
     else:
         # Text files and Python scripts.
-        node.setIcon(0, file_icon("txt"))
-        parse_text(file_name, code, data)
+        doc = result
+        if isinstance(doc, MappedText):
+            data.set_mapped(code, doc)
+        elif doc is not None:
+            data[code] = doc
+            if file_fingerprint is not None:
+                # Same as the file.
+                data.set_saved(code, True)
+                data.set_evictable(code)
+
+
+def parse(
+    node: TreeItem,
+    data: DataDict,
+    keeper: Optional[FileKeeper] = None,
+    progress: ProgressHook = None,
+    lazy: bool = False,
+    cache: bool = False
+):
+    """Parse file to tree format.
+
+    The loaded files will be watched by the file keeper.
+    The "progress" function will be called with the number of
+    loaded files and the total number of files of the project.
+    If "lazy" is True, the files of project are parsed on demand.
+    If "cache" is True, the project cache file will be used.
+    """
+    file_name, suffix_text, code = _prepare(node, data, keeper)
+    if suffix_text == 'kmol':
+        # Kmol project
+        _parse_tree(node, data, keeper, progress, lazy, cache)
+    else:
+        file_fingerprint = fingerprint(file_name)
+        _build(
+            node,
+            suffix_text,
+            code,
+            data,
+            lambda: _read(file_name, suffix_text),
+            file_name,
+            file_fingerprint,
+            keeper
+        )
+    set_root(node, data)
     print("Loaded: {}".format(node.text(1)))
+
+
+def _tree_codes(node: TreeItem) -> List[int]:
+    """Return the codes of the node and its sub-nodes."""
+    codes = []
+    nodes = [node]
+    while nodes:
+        n = nodes.pop()
+        codes.append(int(n.text(2)))
+        nodes.extend(n.child(i) for i in range(n.childCount()))
+    return codes
+
+
+def set_root(node: TreeItem, data: DataDict):
+    """Group the codes of the node and its sub-nodes by their root."""
+    root = node
+    while root.parent() is not None:
+        root = root.parent()
+    data.set_root(_tree_codes(node), int(root.text(2)))
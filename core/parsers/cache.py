@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""Binary cache of Kmol projects.
+
+The cache file is placed next to the project as ".{project name}.cache",
+it stores the tree data of project and the contents of linked files
+with their fingerprints (size, mtime) in marshal format.
+The contents are (file content, file information) pairs.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from typing import (
+    Tuple,
+    Dict,
+    Any,
+    Optional,
+)
+from os import stat
+from os.path import dirname, basename, join
+import marshal
+from core.info import __version__
+
+# Format of the cache, the old caches are dropped when it is changed.
+_FORMAT = 3
+
+Fingerprint = Tuple[int, int]
+# {path: (fingerprint, content)}
+CachedFiles = Dict[str, Tuple[Fingerprint, Any]]
+
+
+def fingerprint(path: str) -> Optional[Fingerprint]:
+    """Return the size and modified time of the file."""
+    try:
+        st = stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _cache_path(proj_name: str) -> str:
+    """Return the path of cache file."""
+    return join(dirname(proj_name), f".{basename(proj_name)}.cache")
+
+
+def load_cache(proj_name: str) -> Tuple[Optional[Dict[str, Any]], CachedFiles]:
+    """Load the cache of project.
+
+    Return None as the tree data if the project has changed.
+    """
+    try:
+        with open(_cache_path(proj_name), 'rb') as f:
+            version, proj_fingerprint, yml_data, files = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None, {}
+    if version != (__version__, _FORMAT):
+        return None, {}
+    if proj_fingerprint != fingerprint(proj_name):
+        yml_data = None
+    return yml_data, files
+
+
+def save_cache(
+    proj_name: str,
+    proj_fingerprint: Fingerprint,
+    yml_data: Dict[str, Any],
+    files: CachedFiles
+):
+    """Save the cache of project.
+
+    The fingerprint of project should be taken before reading it.
+    """
+    try:
+        doc = marshal.dumps(((__version__, _FORMAT), proj_fingerprint, yml_data, files))
+    except ValueError:
+        # Unmarshallable object.
+        return
+    try:
+        with open(_cache_path(proj_name), 'wb') as f:
+            f.write(doc)
+    except OSError as e:
+        print(f"Cache Error: {e}")
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""Edit journal of Kmol projects.
+
+The journal file is placed next to the project as ".{project name}.journal",
+the edited text of nodes are appended to it before the project is saved.
+Each record is a marshal (key, text) pair with its length in front,
+so a broken tail caused by crash can be ignored.
+The nodes are keyed by the codes in project files and the positions in files,
+since their codes in editor may be different in the next session.
+The journal is compacted to the last record of each node when it grows too large.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Tuple, List, Dict, Iterable
+from os import remove, replace, fsync
+from os.path import dirname, basename, join, isfile
+from struct import Struct
+import marshal
+from core.data_structure import DataDict
+from .node import TreeItem
+from .misc import file_suffix
+
+# (path of sub-project, code in project file, position in file)
+JournalKey = Tuple[str, int, Tuple[int, ...]]
+
+_HEADER = Struct('<I')
+_COMPACT_SIZE = 4 << 20
+# {journal path: size after compacted}
+_compacted: Dict[str, int] = {}
+
+
+def journal_key(node: TreeItem, data: DataDict) -> JournalKey:
+    """Return the key of the node in the journal of its root project.
+
+    The sub-nodes of files are numbered when the files are read,
+    so they are keyed by their file node and the position in it.
+    The codes of the other nodes are mapped back to their project files.
+    """
+    anchor = node
+    while anchor is not None and file_suffix(anchor.text(1)) in {'', 'kmol'}:
+        anchor = anchor.parent()
+    if anchor is None:
+        anchor = node
+    position: List[int] = []
+    child = node
+    while child is not anchor:
+        parent = child.parent()
+        position.append(parent.indexOfChild(child))
+        child = parent
+    projects: List[str] = []
+    parent = anchor
+    while parent.parent() is not None:
+        if file_suffix(parent.text(1)) == 'kmol':
+            projects.append(parent.text(1))
+        parent = parent.parent()
+    code = int(anchor.text(2))
+    return '/'.join(reversed(projects)), data.origin(code), tuple(reversed(position))
+
+
+def _journal_path(proj_name: str) -> str:
+    """Return the path of journal file."""
+    return join(dirname(proj_name), f".{basename(proj_name)}.journal")
+
+
+def _pack(key: JournalKey, text: str) -> bytes:
+    """Return the record with its length in front."""
+    record = marshal.dumps((key, text))
+    return _HEADER.pack(len(record)) + record
+
+
+def _write_journal(proj_name: str, records: Dict[JournalKey, str]):
+    """Replace the journal with the records.
+
+    The journal is removed if there is no record.
+    """
+    journal_name = _journal_path(proj_name)
+    if not records:
+        clear_journal(proj_name)
+        return
+    tmp_name = journal_name + '.tmp'
+    try:
+        with open(tmp_name, 'wb') as f:
+            for key, text in records.items():
+                f.write(_pack(key, text))
+            f.flush()
+            fsync(f.fileno())
+            _compacted[journal_name] = f.tell()
+        replace(tmp_name, journal_name)
+    except OSError as e:
+        print(f"Journal Error: {e}")
+
+
+def append_journal(proj_name: str, key: JournalKey, text: str):
+    """Append the text of node to the journal.
+
+    The journal is compacted if it is twice larger than the last compacted size.
+    """
+    journal_name = _journal_path(proj_name)
+    try:
+        with open(journal_name, 'ab') as f:
+            f.write(_pack(key, text))
+            f.flush()
+            fsync(f.fileno())
+            size = f.tell()
+    except OSError as e:
+        print(f"Journal Error: {e}")
+        return
+    if size > max(_COMPACT_SIZE, 2 * _compacted.get(journal_name, 0)):
+        _write_journal(proj_name, read_journal(proj_name))
+
+
+def read_journal(proj_name: str) -> Dict[JournalKey, str]:
+    """Read the journal, return the last text of each node."""
+    try:
+        with open(_journal_path(proj_name), 'rb') as f:
+            doc = f.read()
+    except OSError:
+        return {}
+    records: Dict[JournalKey, str] = {}
+    pos = 0
+    while pos + _HEADER.size <= len(doc):
+        size, = _HEADER.unpack_from(doc, pos)
+        pos += _HEADER.size
+        if pos + size > len(doc):
+            break
+        try:
+            key, text = marshal.loads(doc[pos:pos + size])
+        except (EOFError, ValueError, TypeError):
+            break
+        records[key] = text
+        pos += size
+    return records
+
+
+def discard_journal(proj_name: str, keys: Iterable[JournalKey]):
+    """Remove the records of the nodes from the journal."""
+    records = read_journal(proj_name)
+    if not records:
+        return
+    size = len(records)
+    for key in keys:
+        records.pop(key, None)
+    if len(records) != size:
+        _write_journal(proj_name, records)
+
+
+def clear_journal(proj_name: str):
+    """Remove the journal after the project is saved."""
+    journal_name = _journal_path(proj_name)
+    _compacted.pop(journal_name, None)
+    if not isfile(journal_name):
+        return
+    try:
+        remove(journal_name)
+    except OSError as e:
+        print(f"Journal Error: {e}")
@@ -7,38 +7,40 @@ __copyright__ = "Copyright (C) 2018-2019"
 __license__ = "AGPL"
 __email__ = "pyslvs@gmail.com"
 
+from typing import (
+    Tuple,
+    List,
+    Sequence,
+    Optional,
+)
 import re
 from pygments.formatters.html import HtmlFormatter
 from pygments.styles import get_style_by_name
 from markdown2 import markdown
-from core.QtModules import (
+from core.QtCoreModules import (
     Signal,
-    QWidget,
-    QTreeWidgetItem,
-    QTreeItem,
+    QObject,
     QThread,
 )
 from core.data_structure import DataDict
+from .text import FileInfo, read_text
+from .node import TreeItem, new_item
 
 CODE_STYLE = HtmlFormatter(style=get_style_by_name('default')).get_style_defs()
 
+# (title, level, document)
+Section = Tuple[str, int, str]
+# ((head, sections), file information)
+MarkdownFile = Tuple[Optional[Tuple[str, List[Section]]], Optional[FileInfo]]
 
-def parse_markdown(
-    file_name: str,
-    node: QTreeWidgetItem,
-    code: int,
-    data: DataDict
-):
-    """Parse Markdown file to tree nodes."""
-    try:
-        f = open(file_name, encoding='utf-8')
-    except FileNotFoundError as e:
-        if not data[code]:
-            data[code] = str(e)
-        return
 
-    with f:
-        string_list = f.read().split('\n')
+def split_markdown(doc: str) -> Tuple[str, List[Section]]:
+    """Split Markdown document by its titles.
+
+    Return the head of document and the sections.
+    This function is thread safe.
+    """
+    string_list = doc.split('\n')
 
     # Read the first level of title mark.
     # titles = [(line_num, level), ...]
@@ -63,44 +65,65 @@ def parse_markdown(
                 titles.append((line_num, len(prefix) - 1))
         previous_line = line
 
-    # Joint nodes.
     if not titles:
         # Plain text.
-        data[code] = '\n'.join(string_list)
-        return
+        return doc, []
 
     if titles[0][0] == 0:
         # Start with line 0.
-        data[code] = "@others\n"
+        head = "@others\n"
     else:
-        data[code] = '\n'.join(string_list[:titles[0][0]])
-    tree_items = []
-
-    def parent(t_index: int, t_level: int) -> QTreeWidgetItem:
-        """The parent of current title."""
-        for i, (pre_line, pre_level) in reversed(tuple(enumerate(titles[:t_index]))):
-            if pre_level < t_level:
-                return tree_items[i]
-        return node
+        # Keep the sections after the head.
+        head = '\n'.join(string_list[:titles[0][0]]) + "\n@others\n"
 
+    sections: List[Section] = []
     titles_count = len(titles) - 1
     for index, (line_num, level) in enumerate(titles):
-        code = data.new_num()
         if index == titles_count:
-            doc = string_list[line_num:]
+            lines = string_list[line_num:]
         else:
-            doc = string_list[line_num:titles[index + 1][0]]
+            lines = string_list[line_num:titles[index + 1][0]]
             if titles[index + 1][1] > level:
                 # Has child.
-                doc.append('@others')
-                doc.append('')
-        data[code] = '\n'.join(doc)
-        title = doc[0]
+                lines.append('@others')
+                lines.append('')
+        title = lines[0]
         if title.startswith("#"):
             title = title.split(maxsplit=1)[1]
-        item = QTreeItem(title, '', str(code))
-        parent(index, level).addChild(item)
-        tree_items.append(item)
+        sections.append((title, level, '\n'.join(lines)))
+    return head, sections
+
+
+def read_markdown(file_name: str) -> MarkdownFile:
+    """Read and split Markdown file. This function is thread safe.
+
+    Return the sections and the file information.
+    The sections are None if the file is not a text file.
+    """
+    doc, info = read_text(file_name, mapping=False)
+    if doc is None:
+        return None, None
+    return split_markdown(doc), info
+
+
+def build_markdown(
+    head: str,
+    sections: Sequence[Section],
+    node: TreeItem,
+    code: int,
+    data: DataDict
+):
+    """Joint the sections to tree nodes."""
+    data[code] = head
+    # Parents of current title: [(level, item), ...]
+    parents: List[Tuple[int, TreeItem]] = []
+    for (title, level, doc), code in zip(sections, data.reserve(len(sections))):
+        while parents and parents[-1][0] >= level:
+            parents.pop()
+        data[code] = doc
+        item = new_item(node, title, '', str(code))
+        (parents[-1][1] if parents else node).addChild(item)
+        parents.append((level, item))
 
 
 class PandocTransformThread(QThread):
@@ -109,7 +132,7 @@ class PandocTransformThread(QThread):
 
     send = Signal(str)
 
-    def __init__(self, doc: str, parent: QWidget):
+    def __init__(self, doc: str, parent: QObject):
         super(PandocTransformThread, self).__init__(parent)
         self.doc = doc
 
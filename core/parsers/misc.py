@@ -7,11 +7,11 @@ __copyright__ = "Copyright (C) 2018-2019"
 __license__ = "AGPL"
 __email__ = "pyslvs@gmail.com"
 
-from core.QtModules import (
-    QTreeWidgetItem,
+from core.QtCoreModules import (
     QFileInfo,
     QDir,
 )
+from .node import TreeItem
 
 
 def file_suffix(file_name: str) -> str:
@@ -19,7 +19,7 @@ def file_suffix(file_name: str) -> str:
     return QFileInfo(file_name).completeSuffix()
 
 
-def node_getpath(node: QTreeWidgetItem) -> str:
+def node_getpath(node: TreeItem) -> str:
     """Recursive return the path of the node."""
     path = node.text(1)
     parent = node.parent()
@@ -31,7 +31,7 @@ def node_getpath(node: QTreeWidgetItem) -> str:
     return QDir(node_getpath(parent)).filePath(path)
 
 
-def getpath(node: QTreeWidgetItem) -> str:
+def getpath(node: TreeItem) -> str:
     """Get the path of current node."""
     parent = node.parent()
     file_name = node.text(1)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""Lightweight node model of the project tree.
+
+The node has the same interface of the tree widget items that used by parsers,
+so the projects can be parsed and saved without GUI.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from typing import (
+    TYPE_CHECKING,
+    List,
+    Union,
+    Optional,
+)
+if TYPE_CHECKING:
+    from core.QtModules import QTreeWidgetItem
+
+
+class Node:
+
+    """Tree node without widget."""
+
+    __slots__ = ('texts', 'children', 'parent_node')
+
+    def __init__(self, name: str, path: str, code: str):
+        self.texts = [name, path, code]
+        self.children: List[Node] = []
+        self.parent_node: Optional[Node] = None
+
+    def text(self, column: int) -> str:
+        """Return the text of column. (name, path, code)"""
+        return self.texts[column]
+
+    def setText(self, column: int, text: str):
+        """Set the text of column."""
+        self.texts[column] = text
+
+    def parent(self) -> Optional['Node']:
+        """Return the parent node."""
+        return self.parent_node
+
+    def child(self, index: int) -> 'Node':
+        """Return the child node."""
+        return self.children[index]
+
+    def childCount(self) -> int:
+        """Return the number of child nodes."""
+        return len(self.children)
+
+    def indexOfChild(self, node: 'Node') -> int:
+        """Return the index of the child node."""
+        return self.children.index(node)
+
+    def addChild(self, node: 'Node'):
+        """Append a child node."""
+        node.parent_node = self
+        self.children.append(node)
+
+    def takeChildren(self) -> List['Node']:
+        """Remove and return all the child nodes."""
+        children = self.children
+        self.children = []
+        for node in children:
+            node.parent_node = None
+        return children
+
+
+TreeItem = Union['QTreeWidgetItem', Node]
+
+
+def new_item(model: TreeItem, name: str, path: str, code: str) -> TreeItem:
+    """Create a node with the same model of the node."""
+    if isinstance(model, Node):
+        return Node(name, path, code)
+    # The widgets are only loaded by GUI.
+    from core.QtModules import QTreeItem
+    return QTreeItem(name, path, code)
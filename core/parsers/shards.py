@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""Sharded layout of Kmol projects.
+
+A sharded project is a directory named as the project file:
+
++ "index.yml" stores the description and the nodes of project.
++ "data/{code}.txt" stores the data of each node.
+
+So the unchanged nodes do not need to be written again.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from typing import (
+    Dict,
+    Iterable,
+    Optional,
+)
+from os import scandir, remove, makedirs
+from os.path import isdir, join, basename, dirname
+
+INDEX_NAME = "index.yml"
+_DATA_DIR = "data"
+_BLOB_SUFFIX = ".txt"
+
+
+def is_sharded(proj_name: str) -> bool:
+    """Return True if the project is in sharded layout."""
+    return isdir(proj_name)
+
+
+def project_of(file_name: str) -> str:
+    """Return the project path if the file is the index of a sharded project."""
+    proj_name = dirname(file_name)
+    if basename(file_name) == INDEX_NAME and proj_name.endswith('.kmol'):
+        return proj_name
+    return file_name
+
+
+def index_path(proj_name: str) -> str:
+    """Return the path of index file."""
+    return join(proj_name, INDEX_NAME)
+
+
+def blob_path(proj_name: str, code: int) -> str:
+    """Return the path of node data."""
+    return join(proj_name, _DATA_DIR, f"{code}{_BLOB_SUFFIX}")
+
+
+def _blob_code(name: str) -> Optional[int]:
+    """Return the code of the data file name, or None if it is not a data file.
+
+    The codes can be negative.
+    """
+    if not name.endswith(_BLOB_SUFFIX):
+        return None
+    code = name[:-len(_BLOB_SUFFIX)]
+    try:
+        code_int = int(code)
+    except ValueError:
+        return None
+    # Only the names written by us.
+    return code_int if str(code_int) == code else None
+
+
+def read_blobs(proj_name: str) -> Dict[int, str]:
+    """Read all data of the project."""
+    data: Dict[int, str] = {}
+    data_dir = join(proj_name, _DATA_DIR)
+    if not isdir(data_dir):
+        return data
+    for entry in scandir(data_dir):
+        code = _blob_code(entry.name)
+        if code is None:
+            continue
+        with open(entry.path, encoding='utf-8') as f:
+            data[code] = f.read()
+    return data
+
+
+def write_blob(proj_name: str, code: int, doc: bytes):
+    """Write the data of node."""
+    makedirs(join(proj_name, _DATA_DIR), exist_ok=True)
+    with open(blob_path(proj_name, code), 'wb') as f:
+        f.write(doc)
+
+
+def remove_blobs(proj_name: str, codes: Iterable[int]):
+    """Remove the data of nodes that are not in the codes."""
+    data_dir = join(proj_name, _DATA_DIR)
+    if not isdir(data_dir):
+        return
+    codes = set(codes)
+    for entry in scandir(data_dir):
+        code = _blob_code(entry.name)
+        if code is None or code in codes:
+            continue
+        remove(entry.path)
+        print(f"Removed: {entry.path}")
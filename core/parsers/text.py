@@ -7,28 +7,127 @@ __copyright__ = "Copyright (C) 2018-2019"
 __license__ = "AGPL"
 __email__ = "pyslvs@gmail.com"
 
-from core.data_structure import DataDict
+from typing import (
+    Tuple,
+    Union,
+    Optional,
+)
+from os import fstat, linesep
+from codecs import (
+    BOM_UTF8,
+    BOM_UTF16_LE,
+    BOM_UTF16_BE,
+    BOM_UTF32_LE,
+    BOM_UTF32_BE,
+    getincrementaldecoder,
+)
+from locale import getpreferredencoding
+from core.data_structure import MappedText
+from core.file_keeper import content_hash
 
+# The files larger than this size will be mapped instead of read. (bytes)
+LARGE_FILE_SIZE = 32 * 1024 * 1024
+# (content hash, encoding, newline) of the file
+FileInfo = Tuple[bytes, str, str]
+# (text, file information)
+TextFile = Tuple[Union[str, MappedText, None], Optional[FileInfo]]
+# Size of the prefix to detect the file type. (bytes)
+_SNIFF_SIZE = 8 * 1024
+# BOM must be checked by the order, UTF-32 BOM starts with UTF-16 BOM.
+# The byte order is kept, so the BOM is written back by the same order.
+_BOMS = (
+    (BOM_UTF8, 'utf-8-sig'),
+    (BOM_UTF32_LE, 'utf-32-le'),
+    (BOM_UTF32_BE, 'utf-32-be'),
+    (BOM_UTF16_LE, 'utf-16-le'),
+    (BOM_UTF16_BE, 'utf-16-be'),
+)
+# These codecs do not handle the BOM by themselves.
+_BOM_CODECS = {'utf-32-le', 'utf-32-be', 'utf-16-le', 'utf-16-be'}
 
-def parse_text(
-    file_name: str,
-    code: int,
-    data: DataDict
-):
-    """Just store file content to data structure."""
-    try:
-        f = open(file_name, encoding='utf-8')
-    except FileNotFoundError as e:
-        data[code] = str(e)
-        return
-    except PermissionError:
-        # Is directory
-        return
+
+def sniff(prefix: bytes) -> Optional[str]:
+    """Detect the encoding by the prefix of file.
+
+    Return None if the file is a binary file.
+    """
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if b'\0' in prefix:
+        return None
     try:
-        with f:
-            doc = f.read()
+        # The prefix may break in a multi-byte character.
+        getincrementaldecoder('utf-8')().decode(prefix, final=False)
     except UnicodeDecodeError:
-        # Binary files
-        return
+        return getpreferredencoding(False)
+    else:
+        return 'utf-8'
+
+
+def decode(doc: bytes, encoding: str) -> Tuple[str, str, str]:
+    """Decode the file content as same as the text mode reading.
+
+    Fall back to the legacy encodings if the encoding is not correct.
+    Return the text, the used encoding and the newline of the file,
+    the text and them can be written back by "encode" function.
+    """
+    for e in (encoding, getpreferredencoding(False)):
+        try:
+            text = doc.decode(e)
+        except (UnicodeDecodeError, LookupError):
+            continue
+        else:
+            break
     else:
-        data[code] = doc
+        # Every byte is valid in Latin-1.
+        e = 'latin-1'
+        text = doc.decode(e)
+    if e in _BOM_CODECS:
+        text = text[1:]
+    if '\r\n' in text:
+        newline = '\r\n'
+    elif '\r' in text:
+        newline = '\r'
+    elif '\n' in text:
+        newline = '\n'
+    else:
+        newline = linesep
+    # Universal newlines.
+    return text.replace('\r\n', '\n').replace('\r', '\n'), e, newline
+
+
+def encode(text: str, encoding: str = 'utf-8', newline: str = linesep) -> bytes:
+    """Encode the text with the encoding and newline of its file."""
+    if newline != '\n':
+        text = text.replace('\n', newline)
+    if encoding in _BOM_CODECS:
+        text = '\ufeff' + text
+    return text.encode(encoding)
+
+
+def read_text(file_name: str, mapping: bool = True) -> TextFile:
+    """Read the text file. This function is thread safe.
+
+    Return the text and the file information of the file bytes.
+    The text is None if the file is not a text file,
+    raise FileNotFoundError if the file is not exist.
+    The large UTF-8 files are returned as mapped text if "mapping" is True.
+    """
+    try:
+        f = open(file_name, 'rb')
+    except PermissionError:
+        # Is directory
+        return None, None
+    with f:
+        prefix = f.read(_SNIFF_SIZE)
+        encoding = sniff(prefix)
+        if encoding is None:
+            # Binary files
+            return None, None
+        if mapping and encoding == 'utf-8' and fstat(f.fileno()).st_size > LARGE_FILE_SIZE:
+            mapped = MappedText(file_name)
+            return mapped, (content_hash(mapped.buffer).digest(), encoding, '\n')
+        doc = prefix + f.read()
+    text, encoding, newline = decode(doc, encoding)
+    return text, (content_hash(doc).digest(), encoding, newline)
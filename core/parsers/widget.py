@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""Tree widget settings of the parsed nodes.
+
+This module is imported when the nodes are tree widget items,
+so the parsers can be used without GUI.
+"""
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from typing import Callable
+from core.QtModules import (
+    QTreeWidgetItem,
+    QIcon,
+    QPixmap,
+)
+
+
+def file_icon(file_type: str) -> QIcon:
+    """Return icon by file format."""
+    return QIcon(QPixmap(f":/icons/{file_type}.png"))
+
+
+def set_icon(node: QTreeWidgetItem, suffix_text: str):
+    """Set the icon of file node."""
+    if suffix_text == 'md':
+        node.setIcon(0, file_icon("markdown"))
+    elif suffix_text == 'py':
+        node.setIcon(0, file_icon("python"))
+    elif suffix_text == 'html':
+        # TODO: Need to parse HTML (reveal.js index.html)
+        node.setIcon(0, file_icon("html"))
+    elif suffix_text == 'kmol':
+        node.setIcon(0, file_icon("kmol"))
+    else:
+        node.setIcon(0, file_icon("txt"))
+
+
+def set_indicator(node: QTreeWidgetItem, show: bool):
+    """Show the expand indicator of the node even if it has no sub-node."""
+    if show:
+        node.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+    else:
+        node.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+
+def silent_loader(node: QTreeWidgetItem, loader: Callable[[], None]) -> Callable[[], None]:
+    """Block the signals of tree widget while the loader is running.
+
+    The icons and sub-nodes of the loaded node are not the edits of user.
+    """
+    def load():
+        tree = node.treeWidget()
+        if tree is None:
+            loader()
+            return
+        blocked = tree.blockSignals(True)
+        try:
+            loader()
+        finally:
+            tree.blockSignals(blocked)
+
+    return load
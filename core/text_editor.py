@@ -14,6 +14,7 @@ __email__ = "pyslvs@gmail.com"
 
 from typing import (
     Tuple,
+    Sequence,
     Iterator,
     Match,
     Optional,
@@ -42,6 +43,7 @@ from core.QtModules import (
     # Other highlighters
     QSCI_HIGHLIGHTERS,
 )
+from core.data_structure import MappedText, LineIndex
 
 
 _spell = SpellChecker()
@@ -65,6 +67,8 @@ _commas_markdown = (
     Qt.Key_Semicolon,
     Qt.Key_Colon,
 )
+# Number of lines of each window of large files.
+_WINDOW_LINES = 5000
 
 
 def _finditer(p: str, d: str, flags: Optional[re.RegexFlag] = None) -> Iterator[Match[bytes]]:
@@ -166,9 +170,18 @@ class TextEditor(QsciScintilla):
         # Remove trailing blanks.
         self.__no_trailing_blanks = True
 
+        # Mapped text of large file, show it by windows.
+        self.__mapped: Optional[MappedText] = None
+        self.__mapped_lines = 0
+        self.verticalScrollBar().valueChanged.connect(self.__load_window)
+
         # Spell checker indicator [0]
         self.indicatorDefine(QsciScintilla.SquiggleIndicator, 0)
 
+        # Line index of current text, build when needed.
+        self.__line_index: Optional[LineIndex] = None
+        self.textChanged.connect(self.__text_changed)
+
         # Keyword indicator [1]
         self.indicatorDefine(QsciScintilla.BoxIndicator, 1)
         self.cursorPositionChanged.connect(self.__catch_word)
@@ -192,12 +205,8 @@ class TextEditor(QsciScintilla):
         self.__clear_indicator_all(1)
         pos = self.positionFromLineIndex(line, index)
         _, _, self.word = self.__word_at_pos(pos)
-        for m in _finditer(r'\b' + self.word + r'\b', self.text(), re.IGNORECASE):
-            self.fillIndicatorRange(
-                *self.lineIndexFromPosition(m.start()),
-                *self.lineIndexFromPosition(m.end()),
-                1
-            )
+        spans = [m.span() for m in _finditer(r'\b' + self.word + r'\b', self.text(), re.IGNORECASE)]
+        self.__fill_indicators(spans, 1)
 
     @Slot(str)
     def set_highlighter(self, option: str):
@@ -216,10 +225,11 @@ class TextEditor(QsciScintilla):
 
     def setSelection(self, p1: int, p2: int, p3: Optional[int] = None, p4: Optional[int] = None):
         if p3 is p4 is None:
-            line1, index1 = self.lineIndexFromPosition(p1)
-            line2, index2 = self.lineIndexFromPosition(p2)
+            self.__load_to(self.__mapped.line_of(p2) if self.__mapped else 0)
+            (line1, index1), (line2, index2) = self.line_index().positions((p1, p2))
             super(TextEditor, self).setSelection(line1, index1, line2, index2)
         else:
+            self.__load_to(p3)
             super(TextEditor, self).setSelection(p1, p2, p3, p4)
 
     @Slot(bool)
@@ -370,10 +380,26 @@ class TextEditor(QsciScintilla):
     def spell_check_all(self):
         """Spell check for all text."""
         self.__clear_indicator_all(0)
-        for start, end in _spell_check(self.text()):
-            line1, index1 = self.lineIndexFromPosition(start)
-            line2, index2 = self.lineIndexFromPosition(end)
-            self.fillIndicatorRange(line1, index1, line2, index2, 0)
+        self.__fill_indicators(list(_spell_check(self.text())), 0)
+
+    def line_index(self) -> LineIndex:
+        """Return the line index of current text."""
+        if self.__line_index is None:
+            self.__line_index = LineIndex(self.text().encode('utf-8'))
+        return self.__line_index
+
+    @Slot()
+    def __text_changed(self):
+        """Drop the line index of previous text."""
+        self.__line_index = None
+
+    def __fill_indicators(self, spans: Sequence[Tuple[int, int]], indicator: int):
+        """Fill the indicator of the byte offset spans."""
+        if not spans:
+            return
+        pairs = self.line_index().positions(p for span in spans for p in span)
+        for i in range(0, len(pairs), 2):
+            self.fillIndicatorRange(*pairs[i], *pairs[i + 1], indicator)
 
     def __clear_line_indicator(self, line: int, indicator: int):
         """Clear all indicators."""
@@ -388,13 +414,16 @@ class TextEditor(QsciScintilla):
 
     def remove_trailing_blanks(self):
         """Remove trailing blanks in text editor."""
+        if self.__mapped is not None:
+            return
         scroll_bar: QScrollBar = self.verticalScrollBar()
         pos = scroll_bar.sliderPosition()
 
         line, index = self.getCursorPosition()
-        doc = ""
-        for line_str in self.text().splitlines():
-            doc += line_str.rstrip() + '\n'
+        text = self.text()
+        doc = ''.join(line_str.rstrip() + '\n' for line_str in text.splitlines())
+        if doc == text:
+            return
         self.selectAll()
         self.replaceSelectedText(doc)
 
@@ -402,8 +431,53 @@ class TextEditor(QsciScintilla):
         scroll_bar.setSliderPosition(pos)
 
     def setText(self, doc: str):
-        """Remove trailing blanks in text editor."""
+        """Remove trailing blanks in text editor.
+
+        The text is not modified unless the trailing blanks are removed.
+        """
+        self.__mapped = None
+        self.setReadOnly(False)
         super(TextEditor, self).setText(doc)
+        self.setModified(False)
         if self.__no_trailing_blanks:
             self.remove_trailing_blanks()
         self.spell_check_all()
+
+    def set_mapped(self, mapped: MappedText):
+        """Show the mapped text in read-only mode.
+
+        The lines are loaded by windows when scrolling to the end.
+        """
+        self.__mapped = None
+        self.__clear_indicator_all(0)
+        super(TextEditor, self).setText("")
+        self.setReadOnly(True)
+        self.__mapped = mapped
+        self.__mapped_lines = 0
+        self.__load_window()
+        self.setModified(False)
+
+    def __load_to(self, line: int):
+        """Load the windows of mapped text until the line."""
+        if self.__mapped is None:
+            return
+        while self.__mapped_lines <= min(line, self.__mapped.line_count() - 1):
+            self.__load_window()
+
+    def is_mapped(self) -> bool:
+        """Return True if showing a mapped text."""
+        return self.__mapped is not None
+
+    @Slot()
+    @Slot(int)
+    def __load_window(self, value: Optional[int] = None):
+        """Load next window of mapped text."""
+        if self.__mapped is None:
+            return
+        if self.__mapped_lines >= self.__mapped.line_count():
+            return
+        if value is not None and value < self.verticalScrollBar().maximum():
+            return
+        end = self.__mapped_lines + _WINDOW_LINES
+        self.append(self.__mapped.text(self.__mapped_lines, end))
+        self.__mapped_lines = end
@@ -1,12 +1,15 @@
-# -*- coding: utf-8 -*-
-
-__author__ = "Yuan Chang"
-__copyright__ = "Copyright (C) 2018-2019"
-__license__ = "AGPL"
-__email__ = "pyslvs@gmail.com"
-
-from core import main
-
-
-if __name__ == '__main__':
-    main()
+# -*- coding: utf-8 -*-
+
+__author__ = "Yuan Chang"
+__copyright__ = "Copyright (C) 2018-2019"
+__license__ = "AGPL"
+__email__ = "pyslvs@gmail.com"
+
+from multiprocessing import freeze_support
+from core import main
+
+
+if __name__ == '__main__':
+    # The workers of build command run the job instead of main function.
+    freeze_support()
+    main()